@@ -0,0 +1,235 @@
+"""
+Admission control for browser sessions.
+
+Raising parallelism past what the host can hold makes browsers OOM the
+runner or thrash the CPU. Every browser launch is admitted first: the host
+must have the memory for one more browser plus ADMISSION_MEMORY_RESERVE_MB
+(MemAvailable in /proc/meminfo) and a 1-minute load average per CPU below
+ADMISSION_MAX_LOAD. One browser's size is the mean PSS of the browser
+sessions already running, read from /proc, or ADMISSION_BROWSER_MB before
+any is running. A launch that doesn't fit waits until it does, so the
+number of live browsers settles at what the host can take.
+
+A browser that is still starting hasn't claimed its memory yet, so each
+launch holds a reservation file in ADMISSION_DIR from admission until the
+browser is up. Reservations made earlier, by any process, count as
+browsers already running; worker processes therefore don't all admit into
+the same free memory.
+
+Time spent waiting for admission is not the test's own time: listeners
+(see add_listener) are told when a launch starts and stops waiting, and
+the executor pauses the test's timeout in between.
+
+A browser's size is its proportional set size (PSS), so memory shared
+between a browser's processes is counted once rather than per process.
+
+On hosts without /proc every launch is admitted.
+"""
+
+import os
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from config import (ADMISSION_CONTROL, ADMISSION_DIR, ADMISSION_MEMORY_RESERVE_MB, ADMISSION_BROWSER_MB,
+                    ADMISSION_MAX_LOAD, ADMISSION_POLL_INTERVAL, ADMISSION_TIMEOUT)
+from tracing import span
+
+logger = logging.getLogger('AdmissionControl')
+
+# Processes making up browser sessions; each session has exactly one driver process
+DRIVER_PROCESSES = ("chromedriver", "geckodriver")
+BROWSER_PROCESSES = ("chrome", "chromium", "headless_shell", "firefox", "Web Content", "Isolated Web Co",
+                     "WebExtensions", "Privileged Cont", "RDD Process", "Socket Process", "Utility Process")
+
+_PAGE_MB = os.sysconf("SC_PAGE_SIZE") / (1024 * 1024) if hasattr(os, "sysconf") else 0
+
+_listeners = []
+
+
+def available_memory_mb():
+    """MemAvailable from /proc/meminfo in MB, or None without /proc"""
+    try:
+        with open("/proc/meminfo", 'r') as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+def load_per_cpu():
+    """1-minute load average divided by the CPU count, or None where unavailable"""
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    except (AttributeError, OSError):
+        return None
+
+def add_listener(callback):
+    """
+    Call callback({"event": "admission", "waiting": True, "time": ...}) when
+    a launch in this process starts waiting for admission, and with
+    "waiting": False once it is admitted. "time" is time.time().
+    """
+    _listeners.append(callback)
+
+def _notify(waiting):
+    event = {"event": "admission", "waiting": waiting, "time": time.time()}
+    for callback in _listeners:
+        try:
+            callback(event)
+        except Exception as e:
+            logger.debug(f"Admission listener failed: {e}")
+
+def process_memory_mb(pid):
+    """
+    PSS of a process in MB from /proc/<pid>/smaps_rollup: its private memory
+    plus its share of pages mapped by other processes. Falls back to RSS
+    (statm) where smaps_rollup can't be read.
+    """
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", 'r') as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    with open(f"/proc/{pid}/statm", 'r') as f:
+        return int(f.read().split()[1]) * _PAGE_MB
+
+def browser_usage():
+    """(sessions, memory_mb) of the browsers running on the host, counting every browser and driver process"""
+    sessions = 0
+    memory_mb = 0.0
+    try:
+        pids = [name for name in os.listdir("/proc") if name.isdigit()]
+    except OSError:
+        return 0, 0.0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/comm", 'r') as f:
+                name = f.read().strip()
+            if name in DRIVER_PROCESSES:
+                sessions += 1
+            elif not name.startswith(BROWSER_PROCESSES):
+                continue
+            memory_mb += process_memory_mb(pid)
+        except (OSError, ValueError, IndexError):
+            # The process exited while we were reading it
+            continue
+    return sessions, memory_mb
+
+
+class AdmissionController:
+    """Admits browser launches while the host has headroom for them"""
+
+    def __init__(self, reservation_dir=ADMISSION_DIR, memory_reserve_mb=ADMISSION_MEMORY_RESERVE_MB,
+                 browser_mb=ADMISSION_BROWSER_MB, max_load=ADMISSION_MAX_LOAD,
+                 poll_interval=ADMISSION_POLL_INTERVAL, timeout=ADMISSION_TIMEOUT):
+        self.reservation_dir = reservation_dir
+        self.memory_reserve_mb = memory_reserve_mb
+        self.browser_mb = browser_mb
+        self.max_load = max_load
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+
+    @contextmanager
+    def admit(self):
+        """Wait until one more browser fits, and hold a reservation while it starts"""
+        reservation = self._reserve()
+        try:
+            with span("driver.admission") as admission_span:
+                start = time.monotonic()
+                reason = self._wait(reservation)
+                wait_ms = round((time.monotonic() - start) * 1000, 1)
+                admission_span.set(wait_ms=wait_ms)
+            if reason:
+                _notify(waiting=False)
+                logger.info(f"Browser launch waited {wait_ms:.0f} ms for admission ({reason})")
+            yield wait_ms
+        finally:
+            self._release(reservation)
+
+    def headroom(self, starting=0):
+        """None if one more browser fits alongside `starting` launches in progress, otherwise why not"""
+        available_mb = available_memory_mb()
+        if available_mb is None:
+            return None
+        sessions, memory_mb = browser_usage()
+        browser_mb = memory_mb / sessions if sessions else self.browser_mb
+        needed_mb = browser_mb * (starting + 1) + self.memory_reserve_mb
+        if available_mb < needed_mb:
+            if not sessions and not starting:
+                # Nothing to wait for: the first browser always runs
+                return None
+            return f"{available_mb:.0f} MB available, {needed_mb:.0f} MB needed"
+        load = load_per_cpu()
+        if load is not None and load > self.max_load and (sessions or starting):
+            return f"load {load:.2f} per CPU"
+        return None
+
+    def _wait(self, reservation):
+        """Block until admitted; returns the reason it first had to wait, or None"""
+        deadline = time.monotonic() + self.timeout
+        first_reason = None
+        while True:
+            reason = self.headroom(starting=self._earlier_reservations(reservation))
+            if reason is None:
+                return first_reason
+            if first_reason is None:
+                first_reason = reason
+                logger.info(f"Holding browser launch: {reason}")
+                _notify(waiting=True)
+            if time.monotonic() >= deadline:
+                logger.warning(f"Admitting browser launch after {self.timeout}s without headroom ({reason})")
+                return first_reason
+            time.sleep(self.poll_interval)
+
+    def _reserve(self):
+        os.makedirs(self.reservation_dir, exist_ok=True)
+        # Named so reservations sort by the time they were made
+        path = os.path.join(self.reservation_dir, f"{time.time_ns():020d}-{os.getpid()}-{threading.get_ident()}")
+        open(path, 'w').close()
+        return path
+
+    def _release(self, reservation):
+        try:
+            os.remove(reservation)
+        except FileNotFoundError:
+            pass
+
+    def _earlier_reservations(self, reservation):
+        """Launches admitted or waiting ahead of ours, across processes"""
+        ours = os.path.basename(reservation)
+        count = 0
+        for name in os.listdir(self.reservation_dir):
+            if name >= ours:
+                continue
+            pid = name.split("-")[1]
+            if not os.path.exists(f"/proc/{pid}"):
+                # Left behind by a process that was killed mid-launch
+                self._release(os.path.join(self.reservation_dir, name))
+                continue
+            count += 1
+        return count
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+def get_controller():
+    """Return the process-wide admission controller"""
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            _controller = AdmissionController()
+        return _controller
+
+@contextmanager
+def admit_browser():
+    """Context manager around a browser launch; admits at once when ADMISSION_CONTROL is off or without /proc"""
+    if not ADMISSION_CONTROL or not os.path.isdir("/proc"):
+        yield 0.0
+        return
+    with get_controller().admit() as wait_ms:
+        yield wait_ms
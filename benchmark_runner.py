@@ -0,0 +1,259 @@
+"""
+Offline benchmark suite for the TestSmith pipeline.
+
+Runs a fixed instruction set against a synthetic site on the fixture
+server with a stubbed LLM, so the numbers measure TestSmith itself rather
+than the network or the OpenAI API. Each run does warmup passes, then repeated
+trials, and reports latency percentiles with bootstrap confidence
+intervals, per-stage and per-action breakdowns, and throughput. Results
+can be saved as a baseline and later runs checked against it.
+"""
+
+import json
+import os
+import time
+import logging
+from types import SimpleNamespace
+from contextlib import contextmanager
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from config import BENCH_TRIALS, BENCH_WARMUP, BENCH_REGRESSION_THRESHOLD, BENCH_MIN_REGRESSION_MS
+import nlu_processor
+from nlu_processor import CACHE_OFF
+from metrics import summarize, PERCENTILES
+import fixture_server
+from fixture_server import register_site, REPLAY
+from test_history import RetryPolicy
+
+logger = logging.getLogger('BenchmarkRunner')
+
+# Synthetic site the benchmark tests run against, served by the fixture server
+BENCH_HOST = "bench.testsmith.test"
+FIXTURE_PAGES = {
+    "/": """<html><head><title>Fixture Home</title></head>
+<body><h1>Welcome to the fixture site</h1><a href="/login">Log in</a></body></html>""",
+    "/login": """<html><head><title>Log in</title></head>
+<body>
+<input id="username"><input id="password" type="password">
+<button id="submit" onclick="document.getElementById('message').textContent =
+    'Logged in as ' + document.getElementById('username').value">Log in</button>
+<p id="message"></p>
+</body></html>""",
+    "/search": """<html><head><title>Search</title></head>
+<body>
+<input name="q"><button id="go" onclick="document.getElementById('results').textContent =
+    'Results for ' + document.getElementsByName('q')[0].value">Search</button>
+<div id="results"></div>
+</body></html>""",
+    "/delayed": """<html><head><title>Delayed</title></head>
+<body><script>
+setTimeout(function () {
+    var banner = document.createElement('div');
+    banner.id = 'banner';
+    banner.textContent = 'Ready';
+    document.body.appendChild(banner);
+}, 200);
+</script></body></html>""",
+}
+
+# Instructions and the parse the stubbed LLM returns for each
+BENCHMARK_DATASET = [
+    ("Open the fixture home page and check the heading", {
+        "test_name": "bench_home_heading",
+        "objective": "The home page shows the welcome heading",
+        "steps": [
+            {"action": "navigate", "url": "https://bench.testsmith.test/"},
+            {"action": "verify", "by": "css selector", "locator": "h1", "expected": "Welcome"},
+        ],
+    }),
+    ("Log in with the demo account", {
+        "test_name": "bench_login",
+        "objective": "Logging in shows a confirmation message",
+        "steps": [
+            {"action": "navigate", "url": "https://bench.testsmith.test/login"},
+            {"action": "input", "by": "id", "locator": "username", "text": "demo"},
+            {"action": "input", "by": "id", "locator": "password", "text": "secret"},
+            {"action": "click", "by": "id", "locator": "submit"},
+            {"action": "verify", "by": "id", "locator": "message", "expected": "Logged in as demo"},
+        ],
+    }),
+    ("Search for selenium", {
+        "test_name": "bench_search",
+        "objective": "Searching shows results for the query",
+        "steps": [
+            {"action": "navigate", "url": "https://bench.testsmith.test/search"},
+            {"action": "input", "by": "name", "locator": "q", "text": "selenium"},
+            {"action": "click", "by": "id", "locator": "go"},
+            {"action": "verify", "by": "id", "locator": "results", "expected": "selenium"},
+        ],
+    }),
+    ("Wait for the delayed banner", {
+        "test_name": "bench_delayed_banner",
+        "objective": "The delayed banner appears",
+        "steps": [
+            {"action": "navigate", "url": "https://bench.testsmith.test/delayed"},
+            {"action": "wait", "by": "id", "locator": "banner", "timeout": 5},
+            {"action": "verify", "by": "id", "locator": "banner", "expected": "Ready"},
+        ],
+    }),
+]
+
+# Stages whose durations are summarized, as (metric name, report entry field)
+STAGES = [("parse", "parse_ms"), ("generate", "generate_ms"), ("execute", "execute_ms")]
+
+
+class _StubCompletions:
+    """Answers chat completions from BENCHMARK_DATASET without any network"""
+
+    def __init__(self):
+        self._parses = {instruction: json.dumps(parsed) for instruction, parsed in BENCHMARK_DATASET}
+
+    def create(self, **request):
+        instruction = request["messages"][-1]["content"]
+        content = self._parses.get(instruction, json.dumps({
+            "test_name": "bench_unknown", "objective": instruction, "steps": []
+        }))
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=SimpleNamespace(prompt_tokens=0, completion_tokens=0),
+        )
+
+@contextmanager
+def stubbed_llm():
+    """Route parse_instruction to the stub instead of OpenAI"""
+    original = nlu_processor.client
+    nlu_processor.client = SimpleNamespace(chat=SimpleNamespace(completions=_StubCompletions()))
+    try:
+        yield
+    finally:
+        nlu_processor.client = original
+
+
+def _run_trial(instructions, workers, executor):
+    """Run every instruction once; returns (samples, wall seconds)"""
+    from main import process_instruction
+
+    def run_one(instruction):
+        start = time.perf_counter()
+        # Retries would hide failures and skew latencies
+        entry = process_instruction(instruction, executor=executor, cache_mode=CACHE_OFF, record=False,
+                                    retry_policy=RetryPolicy(0))
+        entry["latency_ms"] = (time.perf_counter() - start) * 1000
+        return entry
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        samples = list(pool.map(run_one, instructions))
+    return samples, time.perf_counter() - start
+
+def _summarize_trials(trials):
+    samples = [sample for trial_samples, _ in trials for sample in trial_samples]
+    metrics = {"latency": summarize([s["latency_ms"] for s in samples])}
+    for stage, field in STAGES:
+        metrics[stage] = summarize([s[field] for s in samples if s.get(field) is not None])
+
+    step_durations = {}
+    for sample in samples:
+        for step in sample.get("step_timings") or []:
+            step_durations.setdefault(step["action"], []).append(step["ms"])
+    for action, durations in sorted(step_durations.items()):
+        metrics[f"step.{action}"] = summarize(durations)
+
+    return {
+        "metrics": metrics,
+        "throughput": summarize([len(trial_samples) / wall for trial_samples, wall in trials]),
+        "failures": sum(1 for s in samples if s["status"] != "PASS"),
+        "samples": len(samples),
+    }
+
+def run_benchmark(trials=BENCH_TRIALS, warmup=BENCH_WARMUP, workers=1, executor=None,
+                  baseline_file=None, save_baseline_file=None, threshold=BENCH_REGRESSION_THRESHOLD):
+    """
+    Run the offline benchmark and print the results.
+    Returns the list of regressions against baseline_file (empty if none).
+    """
+    instructions = [instruction for instruction, _ in BENCHMARK_DATASET]
+    print(f"Benchmark: {len(instructions)} instructions, {warmup} warmup + {trials} trials, {workers} worker(s)")
+
+    register_site(BENCH_HOST, FIXTURE_PAGES)
+    with fixture_server.serving(REPLAY), stubbed_llm():
+        for i in range(warmup):
+            print(f"Warmup {i + 1}/{warmup}...")
+            _run_trial(instructions, workers, executor)
+        trial_results = []
+        for i in range(trials):
+            print(f"Trial {i + 1}/{trials}...")
+            trial_results.append(_run_trial(instructions, workers, executor))
+
+    results = _summarize_trials(trial_results)
+    results["created"] = datetime.now().isoformat()
+    results["settings"] = {"trials": trials, "warmup": warmup, "workers": workers, "executor": executor}
+    print_results(results)
+
+    if save_baseline_file:
+        os.makedirs(os.path.dirname(os.path.abspath(save_baseline_file)), exist_ok=True)
+        with open(save_baseline_file, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nBaseline saved to {save_baseline_file}")
+
+    regressions = []
+    if baseline_file:
+        with open(baseline_file, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline, threshold)
+        print("\n" + "=" * 50)
+        print(f"REGRESSION CHECK vs {baseline_file} (threshold {threshold:.0%})")
+        print("=" * 50)
+        for regression in regressions:
+            print(f"✗ {regression}")
+        if not regressions:
+            print("✓ No regressions")
+    return regressions
+
+def compare_to_baseline(results, baseline, threshold=BENCH_REGRESSION_THRESHOLD):
+    """
+    List the metrics that got worse than the baseline by more than threshold.
+    A change only counts when the whole confidence interval is past the
+    baseline value, so run-to-run noise doesn't fail the check.
+    """
+    regressions = []
+    for metric, current in results["metrics"].items():
+        previous = baseline.get("metrics", {}).get(metric)
+        if not previous or not current["n"]:
+            continue
+        for key in ("p50", "p95"):
+            limit = previous[key] * (1 + threshold)
+            ci_low = current["ci"][key][0]
+            if (current[key] > limit and ci_low > previous[key]
+                    and current[key] - previous[key] >= BENCH_MIN_REGRESSION_MS):
+                regressions.append(
+                    f"{metric} {key}: {current[key]:.1f}ms vs baseline {previous[key]:.1f}ms "
+                    f"(+{current[key] / previous[key] - 1:.0%})")
+
+    previous = baseline.get("throughput")
+    current = results["throughput"]
+    if previous and current["mean"] < previous["mean"] * (1 - threshold) and current["ci"]["mean"][1] < previous["mean"]:
+        regressions.append(
+            f"throughput: {current['mean']:.2f}/s vs baseline {previous['mean']:.2f}/s "
+            f"({current['mean'] / previous['mean'] - 1:.0%})")
+
+    if results["failures"] > baseline.get("failures", 0):
+        regressions.append(f"failures: {results['failures']} vs baseline {baseline.get('failures', 0)}")
+    return regressions
+
+def print_results(results):
+    print("\n" + "=" * 50)
+    print("BENCHMARK RESULTS")
+    print("=" * 50)
+    header = f"{'metric':<20}{'mean':>10}" + "".join(f"{f'p{q}':>10}" for q in PERCENTILES)
+    print(header + f"{'p95 95% CI':>22}")
+    for metric, summary in results["metrics"].items():
+        if not summary["n"]:
+            continue
+        low, high = summary["ci"]["p95"]
+        row = f"{metric:<20}{summary['mean']:>10.1f}" + "".join(f"{summary[f'p{q}']:>10.1f}" for q in PERCENTILES)
+        print(row + f"{f'[{low:.1f}, {high:.1f}]':>22}")
+    throughput = results["throughput"]
+    low, high = throughput["ci"]["mean"]
+    print(f"\nThroughput: {throughput['mean']:.2f} instructions/s (95% CI {low:.2f}-{high:.2f})")
+    print(f"Failures: {results['failures']}/{results['samples']}")
@@ -0,0 +1,61 @@
+"""
+Benchmark: peak memory of streaming Excel report generation.
+
+Each result count is measured in a fresh interpreter, because peak RSS
+(ru_maxrss) only ever grows within a process. With streaming reports the
+peak should stay roughly flat as the number of results grows.
+
+Usage: python benchmarks/bench_excel_report.py [COUNT ...]
+"""
+
+import os
+import sys
+import time
+import subprocess
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_COUNTS = [1000, 10000, 50000, 100000]
+
+def synthetic_results(count):
+    """Result entries shaped like the real ones, spread over several days"""
+    for i in range(count):
+        day = 1 + (i * 7) // count
+        yield {
+            "test_name": f"open_site_{i}",
+            "description": f"Open site number {i} and verify the page title",
+            "status": "PASS" if i % 10 else "FAIL",
+            "error": "" if i % 10 else f"Verification failed. Expected: Welcome, Got: Error {i}",
+            "screenshot_link": "" if i % 10 else f"screenshots/open_site_{i}.png",
+            "generated_code_link": f"test_cases/test_open_site_{i}.json",
+            "timestamp": f"2024-01-{day:02d}T12:00:00",
+        }
+
+def run_child(count):
+    """Generate one report in this process and print: count seconds peak_rss_kb"""
+    import resource
+    import report_generator
+
+    report_generator.REPORTS_DIR = tempfile.mkdtemp(prefix="bench_excel_")
+    start = time.perf_counter()
+    report_generator.generate_excel_reports(synthetic_results(count))
+    elapsed = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"{count} {elapsed:.3f} {peak_kb}")
+
+def main(counts):
+    print(f"{'results':>10} {'seconds':>10} {'peak RSS (MB)':>14}")
+    for count in counts:
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", str(count)],
+            capture_output=True, text=True, check=True
+        ).stdout.split()
+        _, elapsed, peak_kb = output[-3:]
+        print(f"{count:>10} {float(elapsed):>10.2f} {int(peak_kb) / 1024:>14.1f}")
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "--child":
+        run_child(int(sys.argv[2]))
+    else:
+        main([int(arg) for arg in sys.argv[1:]] or DEFAULT_COUNTS)
@@ -0,0 +1,123 @@
+"""
+Benchmark: rule-based NLU fast path against the LLM.
+
+Parses each instruction with fast_parser and reports its latency, how many
+instructions clear FAST_PARSER_MIN_CONFIDENCE, and how often the local
+parse agrees with the LLM's parse of the same instruction. LLM parses come
+from the parse cache; with --live, missing ones are requested from OpenAI
+and their latency is reported alongside.
+
+Agreement is checked per step: same actions in the same order, same
+navigation host, and the same typed/expected text. Locators are compared
+separately, since the two parsers often pick different but equivalent ones.
+
+Usage: python benchmarks/bench_fast_parser.py [--live] [FILE]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metrics
+from config import FAST_PARSER_MIN_CONFIDENCE, MODEL_NAME, TEMPERATURE
+from fast_parser import fast_parse
+
+# Used when no instruction file is given
+SAMPLE_INSTRUCTIONS = [
+    "Open google.com and search for selenium testing",
+    "Go to wikipedia.org and search for artificial intelligence",
+    "Navigate to python.org and check the title",
+    "Open https://example.com and verify the title contains Example Domain",
+    "Open wikipedia and search for 'Alan Turing' then verify #firstHeading contains Alan Turing",
+    "Go to https://the-internet.herokuapp.com/login, type 'tomsmith' into id username, "
+    "type 'SuperSecretPassword!' into id password and click css button[type=submit]",
+    "Visit github.com and search for selenium",
+    "Open python.org, search for decorators and wait for .list-recent-events",
+    "Log in to the admin panel and check the dashboard loads",
+    "Make sure the checkout flow works on the demo store",
+]
+
+def _step_signature(step):
+    """What a step does, leaving out how it finds its element"""
+    action = step.get("action")
+    if action == "navigate":
+        return action, (urlsplit(step.get("url", "")).hostname or "").removeprefix("www.")
+    value = step.get("text", step.get("expected", ""))
+    return action, str(value).strip().lower()
+
+def _locators(steps):
+    return [(step.get("by"), step.get("locator")) for step in steps if "locator" in step]
+
+def llm_parse(instruction, live):
+    """(parsed, seconds) from the parse cache, or from OpenAI with live; (None, None) if unavailable"""
+    from nlu_processor import SYSTEM_PROMPT, get_client, _chat_request
+    from parse_cache import get_cache, cache_key
+
+    key = cache_key(instruction, MODEL_NAME, TEMPERATURE, SYSTEM_PROMPT)
+    cached = get_cache().get(key)
+    if cached is not None or not live or get_client() is None:
+        return cached, None
+    start = time.perf_counter()
+    response = get_client().chat.completions.create(**_chat_request(instruction))
+    seconds = time.perf_counter() - start
+    parsed = json.loads(response.choices[0].message.content)
+    get_cache().put(key, parsed)
+    return parsed, seconds
+
+def main(instructions, live=False, repeat=200):
+    fast_us, llm_ms = [], []
+    confident = compared = agreed = same_locators = 0
+    for instruction in instructions:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            parsed, confidence = fast_parse(instruction)
+        fast_us.append((time.perf_counter() - start) / repeat * 1e6)
+        if confidence < FAST_PARSER_MIN_CONFIDENCE:
+            continue
+        confident += 1
+
+        reference, seconds = llm_parse(instruction, live)
+        if seconds is not None:
+            llm_ms.append(seconds * 1000)
+        if reference is None:
+            continue
+        compared += 1
+        if [_step_signature(s) for s in parsed["steps"]] == [_step_signature(s) for s in reference.get("steps", [])]:
+            agreed += 1
+            same_locators += _locators(parsed["steps"]) == _locators(reference.get("steps", []))
+        else:
+            print(f"✗ Disagrees with the LLM: {instruction}")
+
+    fast = metrics.summarize(fast_us)
+    print(f"\nInstructions: {len(instructions)}")
+    print(f"Fast path latency: p50 {fast['p50']:.1f} µs, p95 {fast['p95']:.1f} µs, p99 {fast['p99']:.1f} µs")
+    print(f"Confident (>= {FAST_PARSER_MIN_CONFIDENCE}): {confident}/{len(instructions)} "
+          f"({confident / len(instructions):.0%}) skip the LLM")
+    if llm_ms:
+        llm = metrics.summarize(llm_ms)
+        print(f"LLM latency: p50 {llm['p50']:.0f} ms, p95 {llm['p95']:.0f} ms "
+              f"({llm['p50'] * 1000 / fast['p50']:.0f}x the fast path at p50)")
+    if compared:
+        print(f"Agreement with the LLM: {agreed}/{compared} ({agreed / compared:.0%}), "
+              f"identical locators in {same_locators}/{agreed}")
+    else:
+        print("Agreement with the LLM: no LLM parses to compare against (run the instructions once, or pass --live)")
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("file", nargs="?", help="Instruction file, one per line (default: built-in sample)")
+    parser.add_argument("--live", action="store_true", help="Ask OpenAI for parses missing from the cache")
+    parser.add_argument("--repeat", type=int, default=200, help="Fast-path parses per instruction for timing")
+    args = parser.parse_args()
+    if args.file:
+        with open(args.file, 'r', encoding='utf-8') as f:
+            instructions = [line.strip() for line in f if line.strip()]
+    else:
+        instructions = SAMPLE_INSTRUCTIONS
+    sys.exit(main(instructions, args.live, args.repeat))
@@ -0,0 +1,82 @@
+"""
+Benchmark and regression check: CLI startup cost.
+
+Runs `python -X importtime -c "import main"` several times in fresh
+interpreters and reports the median import time of main plus the slowest
+modules it pulls in. Fails (exit status 1) when a module that is meant to
+load lazily (openai, openpyxl, selenium, ...) is imported at startup, or
+when the median exceeds --max-ms or regresses past a saved baseline.
+
+Usage: python benchmarks/bench_startup.py [--runs N] [--max-ms MS]
+                                          [--save-baseline FILE] [--baseline FILE] [--threshold FRACTION]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules only the stages that need them may import
+DEFERRED_MODULES = [
+    "openai", "openpyxl", "selenium", "webdriver_manager", "PIL", "pytest",
+    "asyncio", "multiprocessing", "http.server", "urllib.request",
+]
+
+def import_profile():
+    """Import main in a fresh interpreter; returns ({module: (self_us, cumulative_us)}, main_us)"""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=REPO_DIR, capture_output=True, text=True, check=True
+    ).stderr
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if self_us.strip().isdigit():
+            modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules, modules["main"][1]
+
+def main(runs, max_ms=None, save_baseline=None, baseline=None, threshold=0.25):
+    profiles = [import_profile() for _ in range(runs)]
+    modules = profiles[-1][0]
+    median_ms = statistics.median(main_us for _, main_us in profiles) / 1000
+
+    print(f"import main: {median_ms:.1f} ms (median of {runs})")
+    print(f"\n{'self (ms)':>10} {'cumulative (ms)':>16}  module")
+    for name, (self_us, cumulative_us) in sorted(modules.items(), key=lambda item: item[1][0], reverse=True)[:15]:
+        print(f"{self_us / 1000:>10.1f} {cumulative_us / 1000:>16.1f}  {name}")
+
+    failures = [f"{name} is imported at startup" for name in DEFERRED_MODULES if name in modules]
+    if max_ms is not None and median_ms > max_ms:
+        failures.append(f"startup {median_ms:.1f} ms exceeds --max-ms {max_ms:.1f}")
+    if baseline:
+        with open(baseline, 'r') as f:
+            previous = json.load(f)["median_ms"]
+        if median_ms > previous * (1 + threshold):
+            failures.append(f"startup {median_ms:.1f} ms vs baseline {previous:.1f} ms (+{median_ms / previous - 1:.0%})")
+    if save_baseline:
+        with open(save_baseline, 'w') as f:
+            json.dump({"median_ms": median_ms, "runs": runs}, f, indent=2)
+        print(f"\nBaseline saved to {save_baseline}")
+
+    print()
+    for failure in failures:
+        print(f"✗ {failure}")
+    if not failures:
+        print("✓ Startup within limits")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-ms", type=float)
+    parser.add_argument("--save-baseline", metavar="FILE")
+    parser.add_argument("--baseline", metavar="FILE")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed slowdown against the baseline")
+    args = parser.parse_args()
+    sys.exit(main(args.runs, args.max_ms, args.save_baseline, args.baseline, args.threshold))
@@ -1,55 +1,134 @@
 """
-Auto-generated Selenium test by TestSmith AI
+TestSmith AI settings; the pytest fixture lives in conftest.py
 Fixed config import
 """
 
-import pytest
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.service import Service as ChromeService
-from selenium.webdriver.chrome.options import Options
-from webdriver_manager.chrome import ChromeDriverManager
+import os
 
 # ✅ Fixed import (uses package path instead of plain 'config')
 from testsmith_ai.config import HEADLESS, BROWSER, IMPLICIT_WAIT
 
 
-@pytest.fixture
-def driver():
-    """
-    Fixture to initialize and quit WebDriver
-    """
-    if BROWSER.lower() == "chrome":
-        options = Options()
-        if HEADLESS:
-            options.add_argument("--headless")
-        options.add_argument("--no-sandbox")
-        options.add_argument("--disable-dev-shm-usage")
+# Driver pool: warm browser sessions shared by the tests run in one process
+DRIVER_POOL_SIZE = 2               # Maximum live browser sessions per process
+DRIVER_POOL_MAX_USES = 50          # Recycle a session after this many tests
+DRIVER_POOL_HEALTH_CHECK = True    # Ping idle sessions before lending them out
+DRIVER_POOL_ACQUIRE_TIMEOUT = 120  # Seconds to wait for a free session
 
-        driver = webdriver.Chrome(service=ChromeService(ChromeDriverManager().install()), options=options)
+# Test execution
+# Only long-lived workers keep browsers warm between tests; "subprocess" starts one per test
+EXECUTION_MODE = "inprocess"   # "subprocess" (fresh interpreter per test), "inprocess" (long-lived workers) or "packed"
+TEST_TIMEOUT = 300             # Ceiling on any test's timeout, in seconds
+# Per-test timeouts: p99 of a test's recorded runs times a factor once it has history,
+# otherwise derived from its steps (startup + page loads + each step's wait timeout)
+TEST_TIMEOUT_FLOOR = 20             # Never kill a test sooner than this many seconds
+TEST_TIMEOUT_STARTUP = 30           # Seconds allowed for interpreter and browser startup
+TEST_TIMEOUT_NAVIGATE = 30          # Seconds allowed per page load
+TEST_TIMEOUT_HISTORY_FACTOR = 3.0   # Multiplier on the p99 of recorded durations
+TEST_TIMEOUT_MIN_SAMPLES = 5        # Completed runs needed before history sets the timeout
 
-    elif BROWSER.lower() == "firefox":
-        from selenium.webdriver.firefox.service import Service as FirefoxService
-        from selenium.webdriver.firefox.options import Options as FirefoxOptions
-        from webdriver_manager.firefox import GeckoDriverManager
+# NLU parse cache
+PARSE_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "nlu_cache.sqlite3")
+PARSE_CACHE_TTL = 30 * 24 * 3600    # Seconds before a cached parse expires (0 disables expiry)
+PARSE_CACHE_MAX_ENTRIES = 50000     # Least recently used parses beyond this are evicted
 
-        options = FirefoxOptions()
-        if HEADLESS:
-            options.add_argument("--headless")
+# Batch NLU parsing
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")  # Point at a mock server for offline testing; None uses api.openai.com
+NLU_CONCURRENCY = 16      # Parse requests in flight at once when parsing a batch
+NLU_MAX_RETRIES = 5       # Retries per instruction after a 429 rate-limit response
+NLU_BACKOFF_BASE = 1.0    # Seconds; doubled on every retry
+NLU_BACKOFF_MAX = 60.0    # Upper bound for a single backoff
 
-        driver = webdriver.Firefox(service=FirefoxService(GeckoDriverManager().install()), options=options)
+# Result log (reports/test_results.jsonl)
+RESULT_STORE_FSYNC_EVERY = 20       # fsync after this many appended results...
+RESULT_STORE_FSYNC_INTERVAL = 1.0   # ...or this many seconds, whichever comes first
 
-    else:
-        raise ValueError(f"Unsupported browser: {BROWSER}")
+# Excel reports
+EXCEL_SPLIT_BY = "date"             # One sheet per "date", per "run", or None for a single sheet
+EXCEL_MAX_ROWS_PER_FILE = 200000    # Start a new workbook after this many rows
+EXCEL_WIDTH_SAMPLE_ROWS = 500       # Leading rows per sheet used to size the columns
 
-    driver.implicitly_wait(IMPLICIT_WAIT)
-    yield driver
-    driver.quit()
+# Generated test index
+TEST_INDEX_GC_GRACE_DAYS = 7   # --gc-tests keeps unreferenced artifacts used within this many days
 
+# Offline benchmark (--bench)
+BENCH_TRIALS = 5                    # Measured passes over the benchmark dataset
+BENCH_WARMUP = 1                    # Unmeasured passes first (browser start, imports, caches)
+BENCH_REGRESSION_THRESHOLD = 0.10   # Fail --baseline checks when a metric is this much worse
+BENCH_MIN_REGRESSION_MS = 5         # Ignore slowdowns smaller than this in absolute terms
 
-def test_open_google(driver):
-    """
-    Objective: Open google.com homepage and verify title
-    """
-    driver.get("https://www.google.com")
-    assert "Google" in driver.title
+# Fixture server (--fixtures record|replay)
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+FIXTURE_SERVER_PORT = 8765      # Fixed so rewritten tests hash the same across runs; 0 picks a free port
+FIXTURE_RECORD_TIMEOUT = 30     # Seconds to wait for the live site while recording
+
+# Step waits (generated tests run with no implicit wait)
+STEP_TIMEOUTS = {           # Seconds a step waits for its element, unless the step sets "timeout"
+    "click": 10,
+    "input": 10,
+    "verify": 10,
+    "wait": 10,
+    "default": 10,
+}
+STEP_LOCATOR_GRACE = 1.0    # Seconds a missing element is still polled for once the page has settled
+STEP_POLL_INITIAL = 0.05    # First poll interval; grows by STEP_POLL_BACKOFF...
+STEP_POLL_BACKOFF = 1.5
+STEP_POLL_MAX = 0.5         # ...up to this many seconds
+PAGE_NETWORK_IDLE = 0.5     # Seconds without new resource loads that count as network idle
+
+# Distributed execution (--coordinator / --worker)
+DISTRIBUTED_SHARD_SIZE = 8              # Average instructions per shard handed to a worker
+DISTRIBUTED_LEASE_TIMEOUT = 60          # Seconds without a heartbeat before a worker's shard is requeued
+DISTRIBUTED_MAX_ATTEMPTS = 3            # Leases a shard may lose before its instructions are reported as errors
+DISTRIBUTED_DEFAULT_DURATION_MS = 5000  # Expected duration of an instruction with no history and no known peers
+DISTRIBUTED_POLL_INTERVAL = 1.0         # Seconds between queue checks
+DISTRIBUTED_CONNECT_RETRIES = 30        # Failed coordinator requests in a row before a worker gives up
+
+# Run manifest (--incremental / --failed-first)
+MANIFEST_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "run_manifest.sqlite3")
+MANIFEST_FRESHNESS_HOURS = 24   # --incremental reruns passing results older than this
+
+# Failure screenshots (WebP and downscaling need Pillow; without it the PNG is stored as captured)
+SCREENSHOT_FORMAT = "webp"      # "webp" or "png" (optimized)
+SCREENSHOT_QUALITY = 80         # WebP quality, 1-100
+SCREENSHOT_MAX_WIDTH = 1280     # Downscale wider captures to this width; 0 keeps the original size
+
+# Rule-based NLU fast path
+FAST_PARSER_ENABLED = True          # Parse recognisable instructions locally before asking the LLM
+FAST_PARSER_MIN_CONFIDENCE = 0.8    # Lower-confidence local parses go to the LLM instead
+
+# Packed execution (--pack N): light tests share one browser, a tab (Chrome: browser context) each
+PACK_SIZE = 4                       # Tests per browser
+PACK_BROWSERS = 2                   # Browsers (worker processes) running packs at once
+PACK_LINGER = 0.5                   # Seconds a partly filled pack waits for more tests
+PACK_MAX_STEPS = 4                  # Tests with more steps run on a browser of their own
+CHROME_RENDERER_PROCESS_LIMIT = 0   # Cap on Chrome renderer processes shared by the tabs; 0 leaves Chrome's default
+CHROME_JS_HEAP_MB = 0               # V8 heap limit per renderer in MB; 0 leaves Chrome's default
+
+# Retries and test history
+HISTORY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "test_history.sqlite3")
+HISTORY_WINDOW = 20                 # Recent runs per test that flakiness and durations are computed from
+HISTORY_MIN_RUNS = 3                # Runs, all failing, after which a test's failures are not retried
+RETRY_MAX_RETRIES = 2               # Retries per failed test (--retries)
+RETRY_BUDGET_RATIO = 0.25           # Retries a batch may spend, as a fraction of its tests
+RETRY_BACKOFF_BASE = 1.0            # Seconds before the first retry, doubling for each further one...
+RETRY_BACKOFF_MAX = 10.0            # ...up to this many seconds
+RETRY_ON = ("FAIL", "TIMEOUT")      # Statuses worth retrying; ERROR means the test could not run at all
+
+# Pinned browser drivers (--refresh-drivers re-resolves them)
+DRIVER_LOCK_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "drivers.lock.json")
+
+# Streaming pipeline (--pipeline): bounded queues between the parse, generate and execute stages
+PIPELINE_QUEUE_SIZE = 16            # Items a stage may have waiting; a full queue holds back the stage before it
+PIPELINE_PARSE_WORKERS = 8          # Concurrent parses (mostly waiting on the LLM)
+PIPELINE_GENERATE_WORKERS = 2       # Concurrent code generations
+PIPELINE_EXECUTE_WORKERS = 2        # Concurrent test executions (--workers overrides)
+
+# Browser admission control: launches wait while the host lacks memory or CPU for another browser
+ADMISSION_CONTROL = True
+ADMISSION_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "admission")
+ADMISSION_MEMORY_RESERVE_MB = 512   # Memory left free for everything else on the host
+ADMISSION_BROWSER_MB = 400          # Assumed size of a browser until running ones can be measured
+ADMISSION_MAX_LOAD = 1.5            # 1-minute load average per CPU above which launches wait
+ADMISSION_POLL_INTERVAL = 0.5       # Seconds between headroom checks while waiting
+ADMISSION_TIMEOUT = 120             # Seconds after which a waiting launch is admitted anyway
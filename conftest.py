@@ -0,0 +1,55 @@
+"""
+Auto-generated Selenium test by TestSmith AI
+Shared WebDriver fixture
+"""
+
+import pytest
+from selenium import webdriver
+
+from testsmith_ai.config import HEADLESS, BROWSER, IMPLICIT_WAIT
+
+
+@pytest.fixture
+def driver():
+    """
+    Fixture to initialize and quit WebDriver
+    """
+    if BROWSER.lower() == "chrome":
+        from selenium.webdriver.chrome.service import Service as ChromeService
+        from selenium.webdriver.chrome.options import Options
+        from testsmith_ai.driver_resolver import driver_path
+
+        options = Options()
+        if HEADLESS:
+            options.add_argument("--headless")
+        options.add_argument("--no-sandbox")
+        options.add_argument("--disable-dev-shm-usage")
+
+        # Pinned driver path from the lockfile: no version probing or network per test
+        driver = webdriver.Chrome(service=ChromeService(driver_path("chrome")), options=options)
+
+    elif BROWSER.lower() == "firefox":
+        from selenium.webdriver.firefox.service import Service as FirefoxService
+        from selenium.webdriver.firefox.options import Options as FirefoxOptions
+        from testsmith_ai.driver_resolver import driver_path
+
+        options = FirefoxOptions()
+        if HEADLESS:
+            options.add_argument("--headless")
+
+        driver = webdriver.Firefox(service=FirefoxService(driver_path("firefox")), options=options)
+
+    else:
+        raise ValueError(f"Unsupported browser: {BROWSER}")
+
+    driver.implicitly_wait(IMPLICIT_WAIT)
+    yield driver
+    driver.quit()
+
+
+def test_open_google(driver):
+    """
+    Objective: Open google.com homepage and verify title
+    """
+    driver.get("https://www.google.com")
+    assert "Google" in driver.title
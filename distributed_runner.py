@@ -0,0 +1,308 @@
+"""
+Sharded batch execution across worker processes and hosts.
+
+A coordinator (main.py --file batch.txt --coordinator HOST:PORT) splits the
+batch into shards of roughly equal historical duration and hands them out
+over a small JSON/HTTP queue. Workers (main.py --worker http://HOST:PORT)
+lease a shard, run it through run_batch, and post the result entries back.
+Workers renew their lease while they run; when a worker dies its lease
+expires and the shard is handed to another worker. The coordinator is the
+only process that writes to the result log, so the merged batch reads as
+one run.
+"""
+
+import heapq
+import json
+import math
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import logging
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from config import (DISTRIBUTED_SHARD_SIZE, DISTRIBUTED_LEASE_TIMEOUT, DISTRIBUTED_MAX_ATTEMPTS,
+                    DISTRIBUTED_DEFAULT_DURATION_MS, DISTRIBUTED_POLL_INTERVAL, DISTRIBUTED_CONNECT_RETRIES)
+from nlu_processor import CACHE_USE, CACHE_REFRESH, CACHE_OFF
+from metrics import percentile
+
+logger = logging.getLogger('DistributedRunner')
+
+
+def make_shards(instructions, shard_count, durations=None):
+    """
+    Split instructions into shard_count shards of similar expected duration
+    (longest-processing-time first). Instructions with no history count as
+    the median known duration. Returns shards longest first, each as
+    {"id", "items": [(index, instruction)], "estimate_ms"}.
+    """
+    durations = durations or {}
+    known = [durations[i] for i in instructions if i in durations]
+    default = percentile(known, 50) if known else DISTRIBUTED_DEFAULT_DURATION_MS
+
+    shards = [{"items": [], "estimate_ms": 0.0} for _ in range(max(1, min(shard_count, len(instructions))))]
+    loads = [(0.0, i) for i in range(len(shards))]
+    for index, instruction in sorted(enumerate(instructions), key=lambda item: durations.get(item[1], default), reverse=True):
+        load, shard_index = heapq.heappop(loads)
+        shard = shards[shard_index]
+        shard["items"].append((index, instruction))
+        shard["estimate_ms"] = load + durations.get(instruction, default)
+        heapq.heappush(loads, (shard["estimate_ms"], shard_index))
+
+    shards = sorted((shard for shard in shards if shard["items"]), key=lambda shard: shard["estimate_ms"], reverse=True)
+    for shard_id, shard in enumerate(shards):
+        shard["id"] = shard_id
+    return shards
+
+
+class Coordinator:
+    """
+    Work queue of shards with leases. A shard whose lease is not renewed
+    within lease_timeout goes back on the queue; after max_attempts leases
+    its instructions are reported as errors.
+    """
+
+    def __init__(self, instructions, shards, on_result, lease_timeout=DISTRIBUTED_LEASE_TIMEOUT,
+                 max_attempts=DISTRIBUTED_MAX_ATTEMPTS):
+        self.instructions = instructions
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts
+        self._on_result = on_result
+        self._pending = deque(shards)
+        self._leases = {}
+        self._attempts = {}
+        self._results = {}
+        self._done = threading.Condition()
+
+    def lease(self, worker):
+        with self._done:
+            self._reap()
+            if self._pending:
+                shard = self._pending.popleft()
+                self._attempts[shard["id"]] = self._attempts.get(shard["id"], 0) + 1
+                self._leases[shard["id"]] = (shard, worker, time.monotonic() + self.lease_timeout)
+                logger.info(f"Shard {shard['id']} ({len(shard['items'])} items) leased to {worker}")
+                return {
+                    "shard_id": shard["id"],
+                    "items": [{"index": index, "instruction": instruction} for index, instruction in shard["items"]],
+                    "lease_timeout": self.lease_timeout,
+                }
+            if self._complete():
+                return {"done": True}
+            return {"wait": DISTRIBUTED_POLL_INTERVAL}
+
+    def heartbeat(self, worker, shard_id):
+        with self._done:
+            self._reap()
+            lease = self._leases.get(shard_id)
+            if lease is None or lease[1] != worker:
+                return {"ok": False}
+            self._leases[shard_id] = (lease[0], worker, time.monotonic() + self.lease_timeout)
+            return {"ok": True}
+
+    def complete(self, worker, shard_id, entries):
+        accepted = []
+        with self._done:
+            lease = self._leases.get(shard_id)
+            if lease is not None and lease[1] == worker:
+                del self._leases[shard_id]
+            # A late worker may finish a shard that was already requeued: take its results and drop the copy
+            self._pending = deque(shard for shard in self._pending if shard["id"] != shard_id)
+            for entry in entries:
+                if entry["index"] not in self._results:
+                    self._results[entry["index"]] = entry
+                    accepted.append(entry)
+            self._done.notify_all()
+        for entry in accepted:
+            self._on_result(entry)
+        logger.info(f"Shard {shard_id} completed by {worker} ({len(accepted)} new results)")
+        return {"ok": True}
+
+    def wait(self, workers=None):
+        """
+        Block until every instruction has a result. With a list of local
+        worker processes, give up on the remaining work once all of them exit.
+        Returns the results in input order.
+        """
+        with self._done:
+            while not self._complete():
+                self._reap()
+                if workers and all(process.poll() is not None for process in workers):
+                    self._fail_remaining("All worker processes exited")
+                    break
+                self._done.wait(DISTRIBUTED_POLL_INTERVAL)
+            return [self._results[index] for index in range(len(self.instructions))]
+
+    def _complete(self):
+        return len(self._results) == len(self.instructions)
+
+    def _reap(self):
+        """Requeue shards whose lease expired (caller holds the lock)"""
+        now = time.monotonic()
+        for shard_id, (shard, worker, expires) in list(self._leases.items()):
+            if expires > now:
+                continue
+            del self._leases[shard_id]
+            if self._attempts[shard_id] >= self.max_attempts:
+                logger.error(f"Shard {shard_id} lost {self._attempts[shard_id]} times, giving up on it")
+                self._fail(shard, f"Shard abandoned after {self._attempts[shard_id]} lost leases")
+            else:
+                logger.warning(f"Lease on shard {shard_id} held by {worker} expired, requeueing")
+                self._pending.appendleft(shard)
+
+    def _fail_remaining(self, reason):
+        for shard in list(self._pending) + [lease[0] for lease in self._leases.values()]:
+            self._fail(shard, reason)
+        self._pending.clear()
+        self._leases.clear()
+
+    def _fail(self, shard, reason):
+        from main import error_entry
+        for index, instruction in shard["items"]:
+            if index not in self._results:
+                entry = dict(error_entry(instruction, reason), index=index)
+                self._results[index] = entry
+                self._on_result(entry)
+
+
+def _make_handler(coordinator):
+    class CoordinatorHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if self.path == "/lease":
+                response = coordinator.lease(request["worker"])
+            elif self.path == "/heartbeat":
+                response = coordinator.heartbeat(request["worker"], request["shard_id"])
+            elif self.path == "/complete":
+                response = coordinator.complete(request["worker"], request["shard_id"], request["results"])
+            else:
+                self.send_error(404)
+                return
+            body = json.dumps(response).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return CoordinatorHandler
+
+def run_coordinator(instructions, address, spawn_workers=0, worker_threads=1, executor=None, cache_mode=CACHE_USE):
+    """
+    Serve a batch to workers from address ("host:port") and return the merged
+    results in input order. Each result is written to the result log as it
+    arrives, under this run's RUN_ID.
+    """
+    from main import RUN_ID, record_entry
+    from test_history import get_history
+
+    def record(entry):
+        entry["run_id"] = RUN_ID
+        record_entry(entry)
+
+    # At least one shard per local worker so none of them sits idle
+    shard_count = max(math.ceil(len(instructions) / DISTRIBUTED_SHARD_SIZE), spawn_workers)
+    shards = make_shards(instructions, shard_count, get_history().durations(instructions))
+    coordinator = Coordinator(instructions, shards, record)
+
+    host, _, port = address.rpartition(':')
+    server = ThreadingHTTPServer((host or "0.0.0.0", int(port)), _make_handler(coordinator))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="coordinator", daemon=True).start()
+    url = f"http://{'127.0.0.1' if host in ('', '0.0.0.0') else host}:{server.server_port}"
+    print(f"Coordinator serving {len(instructions)} instructions in {len(shards)} shards at {url}")
+
+    workers = [_spawn_worker(url, worker_threads, executor, cache_mode) for _ in range(spawn_workers)]
+    try:
+        results = coordinator.wait(workers)
+        # Idle workers see "done" on their next lease request and exit
+        for process in workers:
+            try:
+                process.wait(timeout=DISTRIBUTED_POLL_INTERVAL * 4)
+            except subprocess.TimeoutExpired:
+                process.terminate()
+    finally:
+        server.shutdown()
+        server.server_close()
+    return results
+
+def _spawn_worker(url, worker_threads, executor, cache_mode):
+    command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py"),
+               "--worker", url, "--workers", str(worker_threads)]
+    if executor:
+        command += ["--executor", executor]
+    if cache_mode == CACHE_OFF:
+        command.append("--no-cache")
+    elif cache_mode == CACHE_REFRESH:
+        command.append("--refresh-cache")
+    from fixture_server import get_fixture_server
+    if get_fixture_server() is not None:
+        command += ["--fixtures", get_fixture_server().mode]
+    return subprocess.Popen(command)
+
+
+def _post(url, path, payload):
+    request = urllib.request.Request(url + path, data=json.dumps(payload).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=DISTRIBUTED_LEASE_TIMEOUT) as response:
+        return json.loads(response.read())
+
+def _keep_lease(url, worker, shard_id, lease_timeout, stop):
+    while not stop.wait(lease_timeout / 3):
+        try:
+            if not _post(url, "/heartbeat", {"worker": worker, "shard_id": shard_id})["ok"]:
+                logger.warning(f"Lost lease on shard {shard_id}")
+        except (urllib.error.URLError, OSError) as e:
+            logger.warning(f"Heartbeat for shard {shard_id} failed: {e}")
+
+def run_worker(url, workers=1, executor=None, cache_mode=CACHE_USE):
+    """Run shards from the coordinator at url until it reports the batch is done"""
+    from main import run_batch
+
+    worker = f"{socket.gethostname()}-{os.getpid()}"
+    url = url.rstrip('/')
+    failures = 0
+    logger.info(f"Worker {worker} pulling work from {url}")
+    while True:
+        try:
+            lease = _post(url, "/lease", {"worker": worker})
+            failures = 0
+        except (urllib.error.URLError, OSError) as e:
+            failures += 1
+            if failures > DISTRIBUTED_CONNECT_RETRIES:
+                logger.error(f"Coordinator at {url} unreachable, stopping: {e}")
+                return
+            time.sleep(DISTRIBUTED_POLL_INTERVAL)
+            continue
+
+        if lease.get("done"):
+            logger.info(f"Worker {worker}: batch complete")
+            return
+        if "wait" in lease:
+            time.sleep(lease["wait"])
+            continue
+
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=_keep_lease, daemon=True,
+                                     args=(url, worker, lease["shard_id"], lease["lease_timeout"], stop))
+        heartbeat.start()
+        try:
+            items = lease["items"]
+            entries = run_batch([item["instruction"] for item in items], workers=workers, executor=executor,
+                                cache_mode=cache_mode, record=False)
+        finally:
+            stop.set()
+            heartbeat.join()
+        results = [dict(entry, index=item["index"], worker=worker) for item, entry in zip(items, entries)]
+        try:
+            _post(url, "/complete", {"worker": worker, "shard_id": lease["shard_id"], "results": results})
+        except (urllib.error.URLError, OSError) as e:
+            # The lease will expire and the shard will be rerun elsewhere
+            logger.error(f"Could not report shard {lease['shard_id']}: {e}")
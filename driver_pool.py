@@ -0,0 +1,280 @@
+import atexit
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from config import (HEADLESS, BROWSER, DRIVER_POOL_SIZE, DRIVER_POOL_MAX_USES,
+                    DRIVER_POOL_HEALTH_CHECK, DRIVER_POOL_ACQUIRE_TIMEOUT,
+                    CHROME_RENDERER_PROCESS_LIMIT, CHROME_JS_HEAP_MB)
+from tracing import traced, annotate
+from driver_resolver import driver_path
+from admission_control import admit_browser
+
+logger = logging.getLogger('DriverPool')
+
+@traced("driver.startup")
+def create_driver(browser=BROWSER, headless=HEADLESS):
+    """
+    Launch a new WebDriver session with the TestSmith browser settings
+    """
+    browser = browser.lower()
+    annotate(browser=browser)
+    # Waits while the host has no memory or CPU to spare for another browser
+    with admit_browser():
+        driver = _launch(browser, headless)
+    # Steps wait explicitly (see step_runtime); an implicit wait would stall every missing element
+    driver.implicitly_wait(0)
+    return driver
+
+
+def _launch(browser, headless):
+    from selenium import webdriver
+
+    if browser == "chrome":
+        from selenium.webdriver.chrome.options import Options
+        from selenium.webdriver.chrome.service import Service
+
+        options = Options()
+        if headless:
+            options.add_argument("--headless=new")
+        options.add_argument("--no-sandbox")
+        options.add_argument("--disable-dev-shm-usage")
+        options.add_argument("--disable-gpu")
+        options.add_argument("--window-size=1920,1080")
+        # Packed tests run in background tabs, which Chrome would otherwise throttle
+        options.add_argument("--disable-background-timer-throttling")
+        options.add_argument("--disable-renderer-backgrounding")
+        options.add_argument("--disable-backgrounding-occluded-windows")
+        if CHROME_RENDERER_PROCESS_LIMIT:
+            options.add_argument(f"--renderer-process-limit={CHROME_RENDERER_PROCESS_LIMIT}")
+        if CHROME_JS_HEAP_MB:
+            options.add_argument(f"--js-flags=--max-old-space-size={CHROME_JS_HEAP_MB}")
+
+        service = Service(driver_path(browser))
+        return _start(webdriver.Chrome, service, options)
+
+    elif browser == "firefox":
+        from selenium.webdriver.firefox.options import Options
+        from selenium.webdriver.firefox.service import Service
+
+        options = Options()
+        if headless:
+            options.add_argument("--headless")
+        service = Service(driver_path(browser))
+        return _start(webdriver.Firefox, service, options)
+
+    else:
+        raise ValueError(f"Unsupported browser: {browser}")
+
+
+def _start(webdriver_class, service, options):
+    from selenium.common.exceptions import SessionNotCreatedException
+    try:
+        return webdriver_class(service=service, options=options)
+    except SessionNotCreatedException:
+        # Usually the browser was updated past the pinned driver
+        logger.error("Browser session could not be created; if the browser was updated, "
+                     "run `python main.py --refresh-drivers`")
+        raise
+
+
+class _PooledDriver:
+    """A live WebDriver session and how many tests it has served"""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.uses = 0
+
+
+class DriverPool:
+    """
+    Keeps up to `size` browser sessions warm and lends them to tests.
+    Sessions are reset between tests and recycled after `max_uses` tests.
+    Warmth only pays off in a long-lived process; one that runs a single
+    test sets single_use, so a released session is left as it is, to be
+    quit on exit, rather than reset for a next test that never comes.
+    """
+
+    def __init__(self, size=DRIVER_POOL_SIZE, max_uses=DRIVER_POOL_MAX_USES,
+                 health_check=DRIVER_POOL_HEALTH_CHECK, browser=BROWSER, headless=HEADLESS):
+        self.size = size
+        self.max_uses = max_uses
+        self.health_check = health_check
+        self.browser = browser
+        self.headless = headless
+        self.single_use = False
+        self._idle = []
+        self._leased = {}
+        self._created = 0
+        self._available = threading.Condition()
+        self._closed = False
+
+    def warm(self, count=None):
+        """Start sessions up front so the first tests don't pay for browser startup"""
+        count = self.size if count is None else min(count, self.size)
+        started = 0
+        while self._created < count and self._reserve_slot():
+            pooled = self._create()
+            with self._available:
+                self._idle.append(pooled)
+                self._available.notify()
+            started += 1
+        logger.info(f"Driver pool warmed with {started} session(s)")
+
+    def acquire(self, timeout=DRIVER_POOL_ACQUIRE_TIMEOUT):
+        """
+        Borrow a healthy driver, launching one if the pool has room.
+        Blocks up to `timeout` seconds when every session is leased.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            pooled = None
+            with self._available:
+                while True:
+                    if self._closed:
+                        raise RuntimeError("Driver pool is closed")
+                    if self._idle:
+                        pooled = self._idle.pop()
+                        break
+                    if self._created < self.size:
+                        self._created += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError(f"No browser session available within {timeout} seconds")
+                    self._available.wait(remaining)
+
+            if pooled is None:
+                pooled = self._create()
+            elif self.health_check and not self._is_healthy(pooled.driver):
+                logger.warning("Discarding unhealthy browser session")
+                self._discard(pooled)
+                continue
+
+            with self._available:
+                self._leased[id(pooled.driver)] = pooled
+            return pooled.driver
+
+    def release(self, driver, broken=False):
+        """Return a borrowed driver, resetting or recycling it"""
+        with self._available:
+            pooled = self._leased.pop(id(driver), None)
+        if pooled is None:
+            logger.warning("Released a driver that does not belong to this pool")
+            return
+
+        pooled.uses += 1
+        if broken or self._closed or pooled.uses >= self.max_uses:
+            self._discard(pooled)
+            return
+
+        if self.single_use:
+            # No next test to reset for; close() quits it as the process exits
+            with self._available:
+                self._idle.append(pooled)
+            return
+
+        try:
+            self._reset(driver)
+        except Exception as e:
+            logger.warning(f"Failed to reset browser session, recycling it: {e}")
+            self._discard(pooled)
+            return
+
+        with self._available:
+            self._idle.append(pooled)
+            self._available.notify()
+
+    @contextmanager
+    def borrow(self, timeout=DRIVER_POOL_ACQUIRE_TIMEOUT):
+        """Context manager around acquire()/release()"""
+        driver = self.acquire(timeout=timeout)
+        try:
+            yield driver
+        finally:
+            self.release(driver)
+
+    def close(self):
+        """Quit every idle session; leased sessions are quit when released"""
+        with self._available:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._available.notify_all()
+        for pooled in idle:
+            self._discard(pooled)
+
+    def _reserve_slot(self):
+        with self._available:
+            if self._created >= self.size:
+                return False
+            self._created += 1
+            return True
+
+    def _create(self):
+        """Launch a session for a slot that has already been reserved"""
+        try:
+            return _PooledDriver(create_driver(self.browser, self.headless))
+        except Exception:
+            with self._available:
+                self._created -= 1
+                self._available.notify()
+            raise
+
+    def _discard(self, pooled):
+        with self._available:
+            self._created -= 1
+            self._available.notify()
+        try:
+            pooled.driver.quit()
+        except Exception as e:
+            logger.debug(f"Error quitting browser session: {e}")
+
+    def _is_healthy(self, driver):
+        try:
+            driver.execute_script("return 1")
+            return True
+        except Exception:
+            return False
+
+    def _reset(self, driver):
+        """Clear cookies, storage and extra tabs left behind by the previous test"""
+        handles = driver.window_handles
+        for handle in handles[1:]:
+            driver.switch_to.window(handle)
+            driver.close()
+        driver.switch_to.window(handles[0])
+
+        origin = None
+        try:
+            origin = driver.execute_script(
+                "window.localStorage.clear(); window.sessionStorage.clear(); return window.location.origin;")
+        except Exception:
+            # Pages such as about:blank or data: URLs have no storage
+            pass
+
+        if hasattr(driver, "execute_cdp_cmd"):
+            # Chrome can drop cookies for every domain, not just the current one
+            driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+            if origin and origin != "null":
+                driver.execute_cdp_cmd("Storage.clearDataForOrigin", {"origin": origin, "storageTypes": "all"})
+        else:
+            driver.delete_all_cookies()
+
+        driver.get("about:blank")
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Return the process-wide driver pool, creating it on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = DriverPool()
+            atexit.register(_pool.close)
+        return _pool
+
+def borrow_driver(timeout=DRIVER_POOL_ACQUIRE_TIMEOUT):
+    """Borrow a warm session from the process-wide pool"""
+    return get_pool().borrow(timeout=timeout)
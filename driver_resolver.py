@@ -0,0 +1,115 @@
+"""
+Pinned browser driver binaries.
+
+Resolving a driver through webdriver_manager probes the browser version,
+reads its cache manifest and may hit the network. It is done once per
+browser and pinned in DRIVER_LOCK_FILE (driver path, driver version and
+browser version); after that every test process reads the pinned path from
+the lockfile, with no network access and a single stat to check the binary
+is still there. Re-resolve with `python main.py --refresh-drivers`, e.g.
+after a browser update.
+"""
+
+import json
+import os
+import re
+import subprocess
+import threading
+import logging
+from datetime import datetime
+from config import DRIVER_LOCK_FILE, BROWSER
+
+logger = logging.getLogger('DriverResolver')
+
+SUPPORTED_BROWSERS = ("chrome", "firefox")
+
+_pins = None
+_pins_lock = threading.Lock()
+
+
+def driver_path(browser):
+    """Path of the pinned driver binary for browser, resolving and pinning it on first use"""
+    browser = browser.lower()
+    with _pins_lock:
+        pin = _load().get(browser)
+        if pin and os.path.isfile(pin["driver_path"]):
+            return pin["driver_path"]
+        if pin:
+            logger.warning(f"Pinned {browser} driver is missing ({pin['driver_path']}), resolving it again")
+        return _pin(browser)["driver_path"]
+
+def refresh(browsers=None):
+    """Resolve drivers again and update the lockfile; returns {browser: pin}"""
+    with _pins_lock:
+        browsers = browsers or sorted(_load()) or [BROWSER.lower()]
+        return {browser: _pin(browser.lower()) for browser in browsers}
+
+def pinned():
+    """The lockfile's pins, {browser: {"driver_path", "driver_version", "browser_version", "resolved_at"}}"""
+    with _pins_lock:
+        return dict(_load())
+
+
+def _load():
+    global _pins
+    if _pins is None:
+        _pins = _read()
+    return _pins
+
+def _read():
+    try:
+        with open(DRIVER_LOCK_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable driver lockfile {DRIVER_LOCK_FILE}: {e}")
+        return {}
+
+def _pin(browser):
+    """Resolve browser's driver through webdriver_manager and write it to the lockfile"""
+    if browser not in SUPPORTED_BROWSERS:
+        raise ValueError(f"Unsupported browser: {browser}")
+    if browser == "chrome":
+        from webdriver_manager.chrome import ChromeDriverManager
+        manager = ChromeDriverManager()
+    else:
+        from webdriver_manager.firefox import GeckoDriverManager
+        manager = GeckoDriverManager()
+
+    path = manager.install()
+    pin = {
+        "driver_path": path,
+        "driver_version": _binary_version(path),
+        "browser_version": _browser_version(manager),
+        "resolved_at": datetime.now().isoformat(),
+    }
+    # Re-read so pins another process wrote meanwhile are kept
+    pins = dict(_read(), **{browser: pin})
+    _write(pins)
+    logger.info(f"Pinned {browser} driver {pin['driver_version'] or ''} at {path}")
+    return pin
+
+def _binary_version(path):
+    try:
+        output = subprocess.run([path, "--version"], capture_output=True, text=True, timeout=10).stdout
+    except (OSError, subprocess.SubprocessError):
+        return None
+    match = re.search(r'\d+(?:\.\d+)+', output)
+    return match.group(0) if match else None
+
+def _browser_version(manager):
+    try:
+        return manager.driver.get_browser_version_from_os()
+    except Exception:
+        return None
+
+def _write(pins):
+    global _pins
+    os.makedirs(os.path.dirname(DRIVER_LOCK_FILE), exist_ok=True)
+    tmp_path = f"{DRIVER_LOCK_FILE}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(pins, f, indent=2, sort_keys=True)
+    # Atomic, so a test process starting meanwhile reads either lockfile whole
+    os.replace(tmp_path, DRIVER_LOCK_FILE)
+    _pins = pins
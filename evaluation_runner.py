@@ -1,6 +1,7 @@
 import time
 from main import process_instruction
 from config import EVALUATION_DATASET
+from metrics import mean, percentile
 import logging
 
 logger = logging.getLogger('EvaluationRunner')
@@ -69,8 +70,8 @@ def run_evaluation():
         data = results[difficulty]
         if data["total"] > 0:
             accuracy = (data["passed"] / data["total"]) * 100
-            avg_latency = sum(data["latencies"]) / len(data["latencies"]) if data["latencies"] else 0
-            p80_latency = sorted(data["latencies"])[int(len(data["latencies"]) * 0.8)] if data["latencies"] else 0
+            avg_latency = mean(data["latencies"])
+            p80_latency = percentile(data["latencies"], 80)
             
             print(f"\n{difficulty.upper()} LEVEL:")
             print(f"  Accuracy: {accuracy:.2f}% ({data['passed']}/{data['total']})")
@@ -82,7 +83,7 @@ def run_evaluation():
     overall = results["overall"]
     overall_accuracy = (overall["passed"] / overall["total"]) * 100 if overall["total"] > 0 else 0
     latencies = overall["latencies"]
-    p80_latency = sorted(latencies)[int(len(latencies) * 0.8)] if latencies else 0
+    p80_latency = percentile(latencies, 80)
     
     print("\n" + "="*50)
     print("SUCCESS CRITERIA CHECK")
@@ -0,0 +1,186 @@
+"""
+Rule-based fast path for the NLU stage.
+
+Templated instructions ("Open python.org and check the title", "type
+'selenium' into the search box", "verify #result contains Welcome") are
+parsed locally with a small set of compiled clause patterns. Each clause
+scores a confidence, and the instruction's confidence is its weakest
+clause. parse_instruction uses the result when the confidence reaches
+FAST_PARSER_MIN_CONFIDENCE and otherwise asks the LLM.
+"""
+
+import re
+from urllib.parse import urlsplit
+from test_generator import normalize_test_name
+
+# Clause separators: "and", "then", commas and semicolons outside quotes
+_SPLIT = re.compile(r'''\s*(?:,?\s+(?:and\s+then|and|then)\s+|[,;]\s*)(?=(?:[^"']*["'][^"']*["'])*[^"']*$)''', re.IGNORECASE)
+
+_QUOTED = r'''(?:"(?P<{0}_dq>[^"]*)"|'(?P<{0}_sq>[^']*)')'''
+_URL = r'(?P<url>https?://\S+|(?:[a-z0-9-]+\.)+[a-z]{2,}(?:/\S*)?|[a-z0-9-]+)'
+
+# Hosts recognised by name alone, with their search box locators and text their home page title contains
+KNOWN_SITES = {
+    "google": ("https://www.google.com", ("name", "q"), "Google"),
+    "wikipedia": ("https://www.wikipedia.org", ("id", "searchInput"), "Wikipedia"),
+    "python": ("https://www.python.org", ("id", "id-search-field"), "Python"),
+    "github": ("https://github.com", ("name", "q"), "GitHub"),
+    "youtube": ("https://www.youtube.com", ("name", "search_query"), "YouTube"),
+    "amazon": ("https://www.amazon.com", ("id", "twotabsearchtextbox"), "Amazon"),
+}
+
+def _pattern(template):
+    return re.compile(template.replace("{TEXT}", _QUOTED.format("text"))
+                              .replace("{EXPECTED}", _QUOTED.format("expected")), re.IGNORECASE)
+
+CLAUSE_PATTERNS = [
+    ("navigate", _pattern(r'^(?:open|go to|navigate to|visit|load|browse to)\s+(?:the\s+)?' + _URL +
+                          r'(?:\s+(?:home\s*page|website|web\s*site|site|page))?$')),
+    ("search", _pattern(r'^search\s+(?:for\s+)?(?:{TEXT}|(?P<text>.+?))(?:\s+on\s+' + _URL + r')?$')),
+    ("input", _pattern(r'^(?:type|enter|input|fill in)\s+(?:{TEXT}|(?P<text>\S+))\s+(?:into|in)\s+(?:the\s+)?(?P<target>.+?)$')),
+    ("click", _pattern(r'^(?:click|press|tap)(?:\s+on)?\s+(?:the\s+)?(?P<target>.+?)$')),
+    ("verify_title", _pattern(r'^(?:check|verify|assert|confirm|ensure)\s+(?:that\s+)?(?:the\s+)?(?:page\s+)?title'
+                              r'(?:\s+(?:contains|is|includes|equals)\s+(?:{EXPECTED}|(?P<expected>.+)))?$')),
+    ("verify", _pattern(r'^(?:check|verify|assert|confirm|ensure)\s+(?:that\s+)?(?:the\s+)?(?P<target>.+?)\s+'
+                        r'(?:contains|shows|displays|says|has text|includes)\s+(?:{EXPECTED}|(?P<expected>.+))$')),
+    ("wait", _pattern(r'^wait\s+(?:for|until)\s+(?:the\s+)?(?P<target>.+?)(?:\s+(?:to appear|appears|is visible|to load|loads))?'
+                      r'(?:\s+(?:for|up to)\s+(?P<seconds>\d+)\s*(?:s|sec|secs|seconds?))?$')),
+]
+
+# Explicit locators in a target phrase, most specific first
+_LOCATORS = [
+    (re.compile(r'^(?:element\s+with\s+)?id\s+["\']?(?P<value>[\w-]+)["\']?$', re.I), "id"),
+    (re.compile(r'^(?:element\s+with\s+)?name\s+["\']?(?P<value>[\w-]+)["\']?$', re.I), "name"),
+    (re.compile(r'^xpath\s+(?P<value>\S.*)$', re.I), "xpath"),
+    (re.compile(r'^(?:css\s+)?["\']?(?P<value>[#.][\w-][\w\s.#>:\[\]=\'"-]*?)["\']?$', re.I), "css selector"),
+    (re.compile(r'^css\s+["\']?(?P<value>.+?)["\']?$', re.I), "css selector"),
+]
+_CONTROL_WORDS = r'\s+(?:button|link|field|box|input|text\s*box|element|tab|icon|menu|heading|banner|message)$'
+
+# Clause confidences
+EXPLICIT = 1.0     # Fully specified clause
+INFERRED = 0.85    # Locator or value derived from well-known conventions
+GUESSED = 0.6      # Locator guessed from a free-text label
+
+
+def _group(match, name):
+    for key in (f"{name}_dq", f"{name}_sq", name):
+        value = match.groupdict().get(key)
+        if value is not None:
+            return value.strip()
+    return None
+
+def _normalize_url(url):
+    """Turn "python.org", "wikipedia" or a full URL into (url, site_key, confidence)"""
+    url = url.rstrip('.,')
+    if re.match(r'https?://', url, re.I):
+        host = urlsplit(url).hostname or ""
+        return url, _site_key(host), EXPLICIT
+    if '.' in url:
+        host = url.split('/')[0].lower()
+        if host.count('.') == 1:
+            url = "www." + url
+        return f"https://{url}", _site_key(host), EXPLICIT
+    site = KNOWN_SITES.get(url.lower())
+    if site is None:
+        return None, None, 0.0
+    return site[0], url.lower(), INFERRED
+
+def _site_key(host):
+    labels = host.lower().split('.')
+    return labels[-2] if len(labels) >= 2 else host
+
+def _known_title(steps):
+    """Title text of the known site's home page the test has just navigated to, else None"""
+    if not steps or steps[-1]["action"] != "navigate":
+        return None
+    url = urlsplit(steps[-1]["url"])
+    for home, _, title in KNOWN_SITES.values():
+        if _bare_host(url.hostname) == _bare_host(urlsplit(home).hostname) and url.path in ("", "/"):
+            return title
+    return None
+
+def _bare_host(host):
+    return (host or "").lower().removeprefix("www.")
+
+def _locator(target, site=None):
+    """(by, locator, confidence) for a target phrase"""
+    target = target.strip().strip('"\'')
+    for pattern, by in _LOCATORS:
+        match = pattern.match(target)
+        if match:
+            return by, match.group("value").strip().strip('"\''), EXPLICIT
+    label = re.sub(_CONTROL_WORDS, '', target, flags=re.I).strip().strip('"\'')
+    if re.fullmatch(r'search(?:\s+(?:bar|box|field|input))?', target, re.I) and site in KNOWN_SITES:
+        by, value = KNOWN_SITES[site][1]
+        return by, value, INFERRED
+    if re.fullmatch(r'[\w-]+', label):
+        # A bare word: most often the id or name of a form control
+        return "css selector", f'#{label}, [name="{label}"]', GUESSED
+    text = label.replace('"', '')
+    return "xpath", f'//*[self::button or self::a or self::input][normalize-space(.)="{text}" or @value="{text}"]', GUESSED
+
+
+def _parsed(instruction, steps):
+    # Name the test after the first few words, like the concise names the LLM picks
+    return {"test_name": normalize_test_name(" ".join(instruction.split()[:6])),
+            "objective": instruction.strip(), "steps": steps}
+
+def fast_parse(instruction):
+    """
+    Parse an instruction locally. Returns (parsed, confidence); parsed has
+    the same test_name/objective/steps shape as an LLM parse, and
+    confidence is 0 when any clause is not understood.
+    """
+    steps = []
+    confidence = EXPLICIT
+    site = None
+    for clause in _SPLIT.split(instruction.strip().rstrip('.!')):
+        if not clause:
+            continue
+        for action, pattern in CLAUSE_PATTERNS:
+            match = pattern.match(clause.strip())
+            if match:
+                break
+        else:
+            return _parsed(instruction, steps), 0.0
+
+        if action == "navigate" or (action == "search" and match.group("url")):
+            url, site, score = _normalize_url(match.group("url"))
+            if url is None:
+                return _parsed(instruction, steps), 0.0
+            steps.append({"action": "navigate", "url": url})
+            confidence = min(confidence, score)
+
+        if action == "search":
+            if site not in KNOWN_SITES:
+                confidence = min(confidence, GUESSED)
+            by, locator = KNOWN_SITES.get(site, (None, ("name", "q"), None))[1]
+            # A trailing newline submits the search form
+            steps.append({"action": "input", "by": by, "locator": locator, "text": _group(match, "text") + "\n"})
+            confidence = min(confidence, INFERRED)
+        elif action in ("input", "click", "verify", "wait"):
+            by, locator, score = _locator(match.group("target"), site)
+            step = {"action": action, "by": by, "locator": locator}
+            if action == "input":
+                step["text"] = _group(match, "text")
+            elif action == "verify":
+                step["expected"] = _group(match, "expected")
+            elif action == "wait" and match.group("seconds"):
+                step["timeout"] = int(match.group("seconds"))
+            steps.append(step)
+            confidence = min(confidence, score)
+        elif action == "verify_title":
+            expected = _group(match, "expected")
+            if expected is None:
+                # "check the title": only a known site's home page has a title we can expect
+                expected = _known_title(steps)
+                if expected is None:
+                    return _parsed(instruction, steps), 0.0
+                confidence = min(confidence, INFERRED)
+            steps.append({"action": "verify_title", "expected": expected})
+
+    if not steps or steps[0]["action"] != "navigate":
+        # Without a page to start from the test cannot run on its own
+        confidence = 0.0
+    return _parsed(instruction, steps), confidence
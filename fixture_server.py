@@ -0,0 +1,283 @@
+"""
+Local fixture web server for offline test execution.
+
+Generated tests normally hit live sites. With a fixture server running,
+navigate URLs are rewritten to http://127.0.0.1:<port>/<host>/<path>, and the
+server answers from recorded responses in FIXTURES_DIR. In "record" mode,
+requests with no recording are fetched from the real site once and saved,
+so later "replay" runs serve them without any network access. Pages that
+were never recorded fall back to a built-in synthetic page set.
+"""
+
+import base64
+import hashlib
+import html
+import json
+import os
+import re
+import threading
+import logging
+from contextlib import contextmanager
+from urllib.parse import urlsplit, parse_qs, quote
+from config import FIXTURES_DIR, FIXTURE_SERVER_PORT, FIXTURE_RECORD_TIMEOUT
+
+logger = logging.getLogger('FixtureServer')
+
+RECORD = "record"
+REPLAY = "replay"
+
+# Absolute URLs in served pages, rewritten so links stay on the fixture server
+_ABSOLUTE_URL = re.compile(r'(["\'(])https?://([A-Za-z0-9.-]+(?::\d+)?)(?=[/"\'?#)])')
+# Root-relative links, which would otherwise lose the /<host> prefix
+_ROOT_RELATIVE = re.compile(r'((?:href|src|action)\s*=\s*["\'])/(?!/)', re.IGNORECASE)
+
+
+def _page(title, body):
+    return f"<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>{html.escape(title)}</title></head><body>{body}</body></html>"
+
+def _google(path, query):
+    if path == "/search":
+        q = query.get("q", [""])[0]
+        results = "".join(
+            f'<div class="g"><h3><a href="/result/{i}">{html.escape(q)} result {i}</a></h3></div>' for i in range(1, 11))
+        return 200, _page(f"{q} - Google Search", f'<textarea name="q">{html.escape(q)}</textarea><div id="search">{results}</div>')
+    if path in ("/", ""):
+        return 200, _page("Google", '<form action="/search"><textarea name="q" title="Search"></textarea>'
+                                    '<input type="submit" name="btnK" value="Google Search"></form>')
+    return None
+
+def _wikipedia(path, query):
+    if path == "/w/index.php" or path.startswith("/wiki/"):
+        topic = query.get("search", [""])[0] if path == "/w/index.php" else path[len("/wiki/"):].replace('_', ' ')
+        return 200, _page(f"{topic} - Wikipedia",
+                          f'<input id="searchInput" name="search"><h1 id="firstHeading">{html.escape(topic)}</h1>'
+                          f'<div id="mw-content-text"><p>{html.escape(topic)} is the subject of this article.</p></div>')
+    if path in ("/", ""):
+        return 200, _page("Wikipedia", '<h1 class="central-textlogo-wrapper">Wikipedia</h1>'
+                                       '<form action="/w/index.php"><input id="searchInput" name="search">'
+                                       '<button type="submit">Search</button></form>')
+    return None
+
+def _python_org(path, query):
+    if path == "/search/":
+        q = query.get("q", [""])[0]
+        return 200, _page("Our Search | Python.org",
+                          f'<input id="id-search-field" name="q" value="{html.escape(q)}">'
+                          f'<ul class="list-recent-events"><li><h3><a href="/doc/">{html.escape(q)}</a></h3></li></ul>')
+    if path in ("/", ""):
+        return 200, _page("Welcome to Python.org",
+                          '<form action="/search/"><input id="id-search-field" name="q"><button id="submit">GO</button></form>'
+                          '<ul id="top"><li><a href="/downloads/">Downloads</a></li><li><a href="/doc/">Documentation</a></li></ul>')
+    return None
+
+# Built-in pages for hosts used by the fallback parser and tests.txt: host -> handler(path, query)
+SYNTHETIC_SITES = {
+    "www.google.com": _google,
+    "google.com": _google,
+    "www.wikipedia.org": _wikipedia,
+    "en.wikipedia.org": _wikipedia,
+    "wikipedia.org": _wikipedia,
+    "www.python.org": _python_org,
+    "python.org": _python_org,
+}
+
+def register_site(host, pages):
+    """Serve a static {path: html} page set for host (e.g. for benchmarks)"""
+    SYNTHETIC_SITES[host] = lambda path, query: (200, pages[path]) if path in pages else None
+
+
+class FixtureServer:
+    """Threaded HTTP server that replays (and optionally records) site fixtures"""
+
+    def __init__(self, mode=REPLAY, port=FIXTURE_SERVER_PORT, fixtures_dir=FIXTURES_DIR):
+        if mode not in (RECORD, REPLAY):
+            raise ValueError(f"Unknown fixture mode: {mode}")
+        self.mode = mode
+        self.fixtures_dir = fixtures_dir
+        self._port = port
+        self._server = None
+        self._thread = None
+        self._responses = {}
+        self._key_locks = {}
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def start(self):
+        # Server modules are imported here so the pipeline can import this module cheaply
+        from http.server import ThreadingHTTPServer
+        try:
+            self._server = ThreadingHTTPServer(("127.0.0.1", self._port), _make_handler(self))
+        except OSError as e:
+            logger.warning(f"Fixture port {self._port} unavailable ({e}), using a free port")
+            self._server = ThreadingHTTPServer(("127.0.0.1", 0), _make_handler(self))
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fixture-server", daemon=True)
+        self._thread.start()
+        logger.info(f"Fixture server ({self.mode}) listening on {self.base_url}")
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def rewrite_url(self, url):
+        """Map an absolute http(s) URL onto the fixture server; other URLs are returned unchanged"""
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.netloc or parts.hostname == "127.0.0.1":
+            return url
+        rewritten = f"{self.base_url}/{parts.netloc}{parts.path or '/'}"
+        return rewritten + (f"?{parts.query}" if parts.query else "")
+
+    def rewrite_parsed(self, parsed):
+        """Copy of a parsed instruction with its navigate URLs pointed at the fixture server"""
+        steps = [
+            dict(step, url=self.rewrite_url(step["url"])) if step.get("action") == "navigate" and step.get("url") else step
+            for step in parsed.get("steps", [])
+        ]
+        return dict(parsed, steps=steps)
+
+    def respond(self, host, path, query_string):
+        """Return (status, content_type, body) for a request to host/path"""
+        key = f"{host}{path}?{query_string}"
+        with self._lock:
+            cached = self._responses.get(key)
+            if cached is not None:
+                return cached
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # One thread loads or records a page; the others wait for its response
+        with key_lock:
+            with self._lock:
+                cached = self._responses.get(key)
+            if cached is not None:
+                return cached
+
+            response = self._load(host, path, query_string)
+            if response is None and self.mode == RECORD:
+                response = self._record(host, path, query_string)
+            if response is None:
+                synthetic = SYNTHETIC_SITES.get(host.lower())
+                result = synthetic(path, parse_qs(query_string)) if synthetic else None
+                if result is not None:
+                    response = (result[0], "text/html; charset=utf-8", result[1].encode("utf-8"))
+            if response is None:
+                # Not cached, so a page whose recording failed is tried again next time
+                logger.warning(f"No fixture for {host}{path}")
+                return (404, "text/html; charset=utf-8",
+                        _page("Not Found", f"<h1>No fixture for {html.escape(host + path)}</h1>").encode("utf-8"))
+
+            status, content_type, body = response
+            if content_type.startswith("text/html"):
+                body = self._rewrite_links(body, host)
+            response = (status, content_type, body)
+            with self._lock:
+                self._responses[key] = response
+            return response
+
+    def _fixture_path(self, host, path, query_string):
+        digest = hashlib.sha256(f"{path}?{query_string}".encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.fixtures_dir, quote(host, safe='.-'), f"{digest}.json")
+
+    def _load(self, host, path, query_string):
+        fixture_file = self._fixture_path(host, path, query_string)
+        if not os.path.exists(fixture_file):
+            return None
+        with open(fixture_file, 'r', encoding='utf-8') as f:
+            fixture = json.load(f)
+        return fixture["status"], fixture["content_type"], base64.b64decode(fixture["body"])
+
+    def _record(self, host, path, query_string):
+        import urllib.error
+        import urllib.request
+        url = f"https://{host}{path}" + (f"?{query_string}" if query_string else "")
+        request = urllib.request.Request(url, headers={"User-Agent": "Mozilla/5.0 (TestSmith fixture recorder)"})
+        try:
+            with urllib.request.urlopen(request, timeout=FIXTURE_RECORD_TIMEOUT) as upstream:
+                status, content_type, body = upstream.status, upstream.headers.get("Content-Type", "text/html"), upstream.read()
+        except urllib.error.HTTPError as e:
+            status, content_type, body = e.code, e.headers.get("Content-Type", "text/html"), e.read()
+        except (urllib.error.URLError, OSError) as e:
+            logger.error(f"Recording {url} failed: {e}")
+            return None
+
+        fixture_file = self._fixture_path(host, path, query_string)
+        os.makedirs(os.path.dirname(fixture_file), exist_ok=True)
+        tmp_file = f"{fixture_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({"url": url, "status": status, "content_type": content_type,
+                       "body": base64.b64encode(body).decode("ascii")}, f)
+        os.replace(tmp_file, fixture_file)
+        logger.info(f"Recorded {url} -> {fixture_file}")
+        return status, content_type, body
+
+    def _rewrite_links(self, body, host):
+        text = body.decode("utf-8", errors="replace")
+        text = _ABSOLUTE_URL.sub(
+            lambda m: m.group(0) if m.group(2).startswith("127.0.0.1") else f"{m.group(1)}{self.base_url}/{m.group(2)}", text)
+        text = _ROOT_RELATIVE.sub(lambda m: f"{m.group(1)}/{host}/", text)
+        return text.encode("utf-8")
+
+
+def _make_handler(fixture_server):
+    from http.server import BaseHTTPRequestHandler
+
+    class FixtureHandler(BaseHTTPRequestHandler):
+        # Keep-alive connections so a browser can reuse one socket per page
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            parts = urlsplit(self.path)
+            host, _, path = parts.path.lstrip('/').partition('/')
+            status, content_type, body = fixture_server.respond(host, '/' + path, parts.query)
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return FixtureHandler
+
+
+_server = None
+_server_lock = threading.Lock()
+
+def start_fixture_server(mode=REPLAY, port=FIXTURE_SERVER_PORT):
+    """Start the process-wide fixture server; generated tests are rewritten to use it"""
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = FixtureServer(mode, port).start()
+        return _server
+
+def get_fixture_server():
+    """The running process-wide fixture server, or None"""
+    return _server
+
+def stop_fixture_server():
+    global _server
+    with _server_lock:
+        if _server is not None:
+            _server.stop()
+            _server = None
+
+def rewrite_parsed(parsed):
+    """Point a parse at the fixture server if one is running, otherwise return it unchanged"""
+    server = _server
+    return server.rewrite_parsed(parsed) if server is not None else parsed
+
+@contextmanager
+def serving(mode=REPLAY, port=FIXTURE_SERVER_PORT):
+    """Run the process-wide fixture server for the duration of a block"""
+    server = start_fixture_server(mode, port)
+    try:
+        yield server
+    finally:
+        stop_fixture_server()
@@ -1,12 +1,26 @@
 import argparse
+import atexit
 import json
+import logging
 import os
 import sys
-from nlu_processor import parse_instruction
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from nlu_processor import parse_instruction, parse_instructions, CACHE_USE, CACHE_REFRESH, CACHE_OFF
 from test_generator import generate_test_code
-from test_executor import execute_test
 from report_generator import add_to_report, generate_excel_report
-from config import TEST_CASES_DIR, REPORTS_DIR, SCREENSHOTS_DIR, LOGS_DIR
+from config import (TEST_CASES_DIR, REPORTS_DIR, SCREENSHOTS_DIR, LOGS_DIR, MANIFEST_FRESHNESS_HOURS, PACK_BROWSERS,
+                    RETRY_MAX_RETRIES, PIPELINE_EXECUTE_WORKERS)
+from run_manifest import get_manifest
+from test_history import get_history, RetryPolicy, is_flaky_pass
+import fixture_server
+import tracing
+from datetime import datetime
+
+# Identifies the results of this invocation in the result log and reports. Kept in the
+# environment so worker processes and modules importing `main` agree with __main__
+RUN_ID = os.environ.setdefault("TESTSMITH_RUN_ID", f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{os.getpid()}")
 
 def ensure_directories():
     """Create necessary directories if they don't exist"""
@@ -16,29 +30,131 @@ def ensure_directories():
     os.makedirs(LOGS_DIR, exist_ok=True)
 
 def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
     ensure_directories()
     
     parser = argparse.ArgumentParser(description='TestSmith AI - Autonomous Selenium Test Engineer')
     parser.add_argument('instruction', nargs='?', help='Natural language test instruction')
-    parser.add_argument('--file', '-f', help='File containing multiple test instructions (one per line)')
+    parser.add_argument('--file', '-f', help='File containing multiple test instructions (one per line); - reads stdin')
+    parser.add_argument('--pipeline', action='store_true',
+                        help='With --file, stream instructions through bounded parse/generate/execute stages')
     parser.add_argument('--eval', '-e', action='store_true', help='Run evaluation on the test dataset')
+    parser.add_argument('--workers', '-w', type=int, default=1, help='Number of instructions to process concurrently in batch mode')
+    parser.add_argument('--executor', choices=['subprocess', 'inprocess', 'packed'], help='How generated tests are run (default: EXECUTION_MODE from config)')
+    parser.add_argument('--pack', type=int, metavar='N',
+                        help='Run light tests N to a browser, one tab each (implies --executor packed)')
+    parser.add_argument('--pack-browsers', type=int, default=PACK_BROWSERS, metavar='M',
+                        help='With --pack, browsers running packs at once')
+    cache_group = parser.add_mutually_exclusive_group()
+    cache_group.add_argument('--no-cache', dest='cache_mode', action='store_const', const=CACHE_OFF, help='Do not read or write the NLU parse cache')
+    cache_group.add_argument('--refresh-cache', dest='cache_mode', action='store_const', const=CACHE_REFRESH, help='Re-parse every instruction and overwrite its cache entry')
+    parser.set_defaults(cache_mode=CACHE_USE)
+    parser.add_argument('--compact-results', nargs='?', const=0, type=int, metavar='KEEP',
+                        help='Compact the result log, optionally keeping only the newest KEEP entries')
+    parser.add_argument('--gc-tests', action='store_true', help='Delete generated test artifacts no test name refers to')
+    parser.add_argument('--refresh-drivers', action='store_true',
+                        help='Resolve the browser drivers again and update the driver lockfile')
+    parser.add_argument('--trace', metavar='DIR', help='Record per-stage spans to DIR as JSONL and a Chrome trace')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Skip instructions that passed recently and whose parse and generator are unchanged')
+    parser.add_argument('--freshness', type=float, default=MANIFEST_FRESHNESS_HOURS, metavar='HOURS',
+                        help='With --incremental, rerun passing results older than HOURS')
+    parser.add_argument('--failed-first', action='store_true',
+                        help='Run instructions that failed last time first, then new ones, then the rest')
+    parser.add_argument('--retries', type=int, default=RETRY_MAX_RETRIES, metavar='N',
+                        help='Retry a failed or timed-out test up to N times (0 disables retries)')
+    parser.add_argument('--coordinator', metavar='HOST:PORT',
+                        help='With --file, serve the batch to --worker processes from HOST:PORT and merge their results')
+    parser.add_argument('--spawn-workers', type=int, default=0, metavar='N',
+                        help='With --coordinator, also start N local worker processes')
+    parser.add_argument('--worker', metavar='URL', help='Run batch shards handed out by the coordinator at URL')
+    parser.add_argument('--fixtures', choices=['record', 'replay'],
+                        help='Run tests against the local fixture server, recording missing pages or replaying only')
+    parser.add_argument('--bench', action='store_true', help='Run the offline benchmark against the local fixture site')
+    parser.add_argument('--trials', type=int, help='Measured benchmark trials (default: BENCH_TRIALS from config)')
+    parser.add_argument('--warmup', type=int, help='Unmeasured warmup passes (default: BENCH_WARMUP from config)')
+    parser.add_argument('--baseline', metavar='FILE', help='Fail the benchmark if it regressed against this baseline')
+    parser.add_argument('--save-baseline', metavar='FILE', help='Save the benchmark results as a baseline')
     
     args = parser.parse_args()
+
+    if args.trace:
+        enable_tracing(args.trace)
+
+    if args.pack:
+        from test_executor import start_packer
+        start_packer(size=args.pack, browsers=args.pack_browsers)
+        args.executor = "packed"
+        # Packs only fill up when enough tests are in flight at once
+        if args.workers < args.pack * args.pack_browsers:
+            args.workers = args.pack * args.pack_browsers
+            print(f"Packing {args.pack} tests per browser: running {args.workers} instructions concurrently")
+
+    if args.fixtures:
+        from fixture_server import start_fixture_server
+        server = start_fixture_server(args.fixtures)
+        print(f"Serving {args.fixtures} fixtures at {server.base_url}")
     
+    if args.compact_results is not None:
+        from result_store import compact
+        kept = compact(max_entries=args.compact_results or None)
+        print(f"Result log compacted: {kept} entries kept")
+        return
+
+    if args.refresh_drivers:
+        from driver_resolver import refresh
+        for browser, pin in refresh().items():
+            print(f"{browser}: driver {pin['driver_version'] or 'unknown version'} at {pin['driver_path']} "
+                  f"(browser {pin['browser_version'] or 'version unknown'})")
+        return
+
+    if args.gc_tests:
+        from test_index import get_index
+        removed = get_index().gc()
+        print(f"Removed {removed} unreferenced test artifacts")
+        return
+
+    if args.bench:
+        from benchmark_runner import run_benchmark
+        from config import BENCH_TRIALS, BENCH_WARMUP
+        regressions = run_benchmark(
+            trials=args.trials if args.trials is not None else BENCH_TRIALS,
+            warmup=args.warmup if args.warmup is not None else BENCH_WARMUP,
+            workers=args.workers, executor=args.executor,
+            baseline_file=args.baseline, save_baseline_file=args.save_baseline)
+        sys.exit(1 if regressions else 0)
+
     if args.eval:
         from evaluation_runner import run_evaluation
         run_evaluation()
         return
     
+    if args.worker:
+        from distributed_runner import run_worker
+        run_worker(args.worker, workers=args.workers, executor=args.executor, cache_mode=args.cache_mode)
+        return
+
+    if args.file and args.pipeline:
+        run_streaming(args)
+        return
+
     if args.file:
-        with open(args.file, 'r') as f:
+        with open(args.file, 'r') if args.file != '-' else sys.stdin as f:
             instructions = [line.strip() for line in f.readlines() if line.strip()]
+        if args.failed_first:
+            instructions = get_manifest().failed_first(instructions)
         
-        results = []
-        for instruction in instructions:
-            print(f"\nProcessing: {instruction}")
-            result = process_instruction(instruction)
-            results.append(result)
+        if args.coordinator:
+            from distributed_runner import run_coordinator
+            results = run_coordinator(instructions, args.coordinator, spawn_workers=args.spawn_workers,
+                                      worker_threads=args.workers, executor=args.executor, cache_mode=args.cache_mode)
+        else:
+            results = run_batch(instructions, workers=args.workers, executor=args.executor, cache_mode=args.cache_mode,
+                                incremental=args.incremental, freshness=args.freshness, retries=args.retries)
+
+        passed = sum(entry["status"] == "PASS" for entry in results)
+        flaky = sum(is_flaky_pass(entry) for entry in results)
+        print(f"\n{passed - flaky} passed, {flaky} passed after a retry (flaky), {len(results) - passed} did not pass")
         
         # Generate comprehensive report
         generate_excel_report(results)
@@ -50,37 +166,216 @@ def main():
         parser.print_help()
         return
     
-    process_instruction(args.instruction)
+    process_instruction(args.instruction, executor=args.executor, cache_mode=args.cache_mode,
+                        retry_policy=RetryPolicy.for_tests([args.instruction], args.retries))
+
+def run_streaming(args):
+    """Run --file through the streaming pipeline and report the results this run recorded"""
+    from pipeline import read_instructions, run_pipeline
+    from result_store import get_store, iter_results
+    if args.failed_first or args.coordinator:
+        print("--failed-first and --coordinator need the whole batch up front; ignored with --pipeline")
+    try:
+        instructions = read_instructions(args.file)
+    except OSError as e:
+        print(f"Cannot read instructions from {args.file}: {e}")
+        sys.exit(1)
+    try:
+        counts = run_pipeline(instructions, executor=args.executor, cache_mode=args.cache_mode,
+                              incremental=args.incremental, freshness=args.freshness, retries=args.retries,
+                              execute_workers=args.workers if args.workers > 1 else PIPELINE_EXECUTE_WORKERS)
+        error = None
+    except (OSError, ValueError) as e:
+        # The instructions read before the error have run; report them, then fail
+        counts, error = None, e
+
+    if counts:
+        print(f"\n{counts['passed'] - counts['flaky']} passed, {counts['flaky']} passed after a retry (flaky), "
+              f"{counts['total'] - counts['passed']} did not pass")
+        if counts["reused"]:
+            print(f"Incremental: reused {counts['reused']} unchanged passing results")
+
+    get_store().flush()
+    generate_excel_report(iter_results(run_id=RUN_ID))
+    if error is not None:
+        print(f"\nStopped reading instructions from {args.file}: {error}. "
+              f"Results of the instructions before it are saved to {REPORTS_DIR}")
+        sys.exit(1)
+    print(f"\nBatch processing complete. Results saved to {REPORTS_DIR}")
+
+def enable_tracing(trace_dir):
+    """Trace this run to trace_dir; the Chrome trace is exported on exit"""
+    trace_file = os.path.join(trace_dir, f"trace_{RUN_ID}.jsonl")
+    tracing.enable(trace_file)
+
+    def export():
+        if os.path.exists(trace_file):
+            chrome_trace = tracing.export_chrome_trace(trace_file, os.path.join(trace_dir, f"trace_{RUN_ID}.json"))
+            print(f"Trace written to {trace_file} (Chrome trace: {chrome_trace})")
+    atexit.register(export)
+
+def run_batch(instructions, workers=1, executor=None, cache_mode=CACHE_USE, record=True,
+              incremental=False, freshness=MANIFEST_FRESHNESS_HOURS, retries=RETRY_MAX_RETRIES):
+    """
+    Run instructions through the pipeline on a bounded worker pool.
+    Results are returned in input order. With incremental=True, instructions
+    that passed within `freshness` hours with unchanged inputs are not rerun;
+    their last result is reported again. Failed tests are retried up to
+    `retries` times, within a retry budget shared by the batch.
+    """
+    reused = get_manifest().reusable(instructions, freshness) if incremental else {}
+    if reused:
+        print(f"Incremental: reusing {len(reused)} unchanged passing results")
+    to_run = [instruction for instruction in instructions if instruction not in reused]
+
+    # Parse the whole batch up front so LLM requests run concurrently
+    print(f"Parsing {len(to_run)} instructions...")
+    parsed = parse_instructions(to_run, cache_mode=cache_mode)
+
+    process_item = partial(_process_batch_item, executor=executor, record=record,
+                           retry_policy=RetryPolicy.for_tests(to_run, retries))
+    if workers <= 1:
+        results = [process_item(instruction, parsed_data) for instruction, parsed_data in zip(to_run, parsed)]
+    else:
+        # Start slow and flaky tests first so they don't become the tail of the batch
+        rank = {instruction: i for i, instruction in enumerate(get_history().schedule(to_run, retries))}
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {i: pool.submit(process_item, to_run[i], parsed[i])
+                       for i in sorted(range(len(to_run)), key=lambda i: rank[to_run[i]])}
+            results = [futures[i].result() for i in range(len(to_run))]
 
-def process_instruction(instruction):
-    """Process a single instruction through the full pipeline"""
+    results = iter(results)
+    return [_reuse_entry(reused[instruction], record) if instruction in reused else next(results)
+            for instruction in instructions]
+
+def _reuse_entry(entry, record=True):
+    """Report a previous result again under this run"""
+    entry = dict(entry, run_id=RUN_ID, reused_from=entry.get("run_id"),
+                 parse_ms=None, generate_ms=None, execute_ms=None, step_timings=[])
+    if record:
+        add_to_report(entry)
+    return entry
+
+def _process_batch_item(instruction, parsed_data=None, executor=None, record=True, retry_policy=None):
+    """Process one batch instruction, turning unexpected errors into an ERROR entry"""
+    print(f"\nProcessing: {instruction}")
+    try:
+        return process_instruction(instruction, executor=executor, parsed_data=parsed_data, record=record,
+                                   retry_policy=retry_policy)
+    except Exception as e:
+        print(f"Error processing '{instruction}': {e}")
+        entry = error_entry(instruction, str(e))
+        if record:
+            get_manifest().record(entry)
+            get_history().record(entry)
+        return entry
+
+def error_entry(instruction, error):
+    """Report entry for an instruction that could not be run at all"""
+    return {
+        "test_name": instruction,
+        "description": instruction,
+        "status": "ERROR",
+        "error": error,
+        "screenshot_link": "",
+        "generated_code_link": "",
+        "timestamp": "",
+        "run_id": RUN_ID,
+        "instruction": instruction
+    }
+
+def record_entry(entry):
+    """Write a finished run to the test history, the result log and the run manifest"""
+    history = get_history()
+    history.record(entry)
+    entry["flakiness"] = history.stats([entry["instruction"]]).get(entry["instruction"], {}).get("flakiness")
+    add_to_report(entry)
+    get_manifest().record(entry)
+
+@tracing.traced("pipeline")
+def process_instruction(instruction, executor=None, cache_mode=CACHE_USE, parsed_data=None, record=True,
+                        retry_policy=None):
+    """
+    Process a single instruction through the full pipeline.
+    Pass parsed_data to skip parsing when the instruction was already parsed,
+    and record=False to keep the result out of the result log.
+    A failed test is run again while retry_policy allows (default: a
+    policy for this test alone); pass RetryPolicy(0) to run it once.
+    """
     print(f"[1/4] Parsing instruction: {instruction}")
-    parsed_data = parse_instruction(instruction)
+    parse_ms = None
+    if parsed_data is None:
+        start = time.perf_counter()
+        parsed_data = parse_instruction(instruction, cache_mode=cache_mode)
+        parse_ms = _elapsed_ms(start)
+    # No-op unless --fixtures started the fixture server
+    parsed_data = fixture_server.rewrite_parsed(parsed_data)
 
     print("[2/4] Generating test code...")
+    start = time.perf_counter()
     test_code, code_path = generate_test_code(parsed_data)
+    generate_ms = _elapsed_ms(start)
 
     print("[3/4] Executing test...")
-    status, output, code_path, screenshot_path = execute_test(test_code, parsed_data['test_name'])
+    start = time.perf_counter()
+    result = execute_with_retries(instruction, parsed_data, test_code, code_path, executor, retry_policy)
+    execute_ms = _elapsed_ms(start)
 
     print("[4/4] Generating report...")
-    report_entry = {
+    report_entry = make_entry(instruction, parsed_data, result, parse_ms, generate_ms, execute_ms)
+    status, output = result[0], result[1]
+
+    if record:
+        record_entry(report_entry)
+    print(f"Test '{parsed_data['test_name']}' completed with status: {status}")
+    
+    if status == "FAIL":
+        print(f"Error: {output}")
+    
+    return report_entry
+
+def execute_with_retries(instruction, parsed_data, test_code, code_path, executor=None, retry_policy=None):
+    """
+    Run a generated test under its adaptive timeout, again while
+    retry_policy allows. Returns (status, output, code_path,
+    screenshot_path, step_timings, attempts).
+    """
+    from test_executor import execute_test, adaptive_timeout
+    retry_policy = retry_policy or RetryPolicy.for_tests([instruction])
+    timeout = adaptive_timeout(parsed_data.get('steps', []), get_history().attempt_durations(instruction))
+    attempt = 1
+    while True:
+        status, output, code_path, screenshot_path, step_timings = execute_test(
+            test_code, parsed_data['test_name'], test_file=code_path, mode=executor, timeout=timeout)
+        if not retry_policy.should_retry(instruction, attempt, status):
+            return status, output, code_path, screenshot_path, step_timings, attempt
+        delay = retry_policy.delay(attempt)
+        print(f"Attempt {attempt} of '{parsed_data['test_name']}' ended with {status}, retrying in {delay:.1f}s...")
+        time.sleep(delay)
+        attempt += 1
+
+def make_entry(instruction, parsed_data, result, parse_ms=None, generate_ms=None, execute_ms=None):
+    """Report entry for an executed test; result is what execute_with_retries returned"""
+    status, output, code_path, screenshot_path, step_timings, attempts = result
+    return {
         "test_name": parsed_data['test_name'],
         "description": parsed_data['objective'],
         "status": status,
         "error": output if status == "FAIL" else "",
         "screenshot_link": screenshot_path,
         "generated_code_link": code_path,
-        "timestamp": parsed_data.get('timestamp', '')
+        "timestamp": parsed_data.get('timestamp', ''),
+        "run_id": RUN_ID,
+        "instruction": instruction,
+        "parse_ms": parse_ms,
+        "generate_ms": generate_ms,
+        "execute_ms": execute_ms,
+        "step_timings": step_timings,
+        "attempts": attempts
     }
-    
-    add_to_report(report_entry)
-    print(f"Test '{parsed_data['test_name']}' completed with status: {status}")
-    
-    if status == "FAIL":
-        print(f"Error: {output}")
-    
-    return report_entry
+
+def _elapsed_ms(start):
+    return round((time.perf_counter() - start) * 1000, 1)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,48 @@
+import math
+import random
+
+# Percentiles reported for every latency metric
+PERCENTILES = (50, 80, 95, 99)
+
+def percentile(values, q):
+    """
+    q-th percentile (0-100) of values with linear interpolation between
+    closest ranks, so small samples don't snap to a single observation.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100
+    low = math.floor(rank)
+    high = math.ceil(rank)
+    if low == high:
+        return ordered[low]
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+def mean(values):
+    return sum(values) / len(values) if values else 0.0
+
+def bootstrap_ci(values, statistic, confidence=0.95, resamples=1000, seed=0):
+    """
+    Bootstrap confidence interval for statistic(values).
+    Returns (low, high); a fixed seed keeps reports reproducible.
+    """
+    if len(values) < 2:
+        value = statistic(values) if values else 0.0
+        return value, value
+    rng = random.Random(seed)
+    estimates = sorted(
+        statistic([rng.choice(values) for _ in values]) for _ in range(resamples)
+    )
+    tail = (1 - confidence) / 2 * 100
+    return percentile(estimates, tail), percentile(estimates, 100 - tail)
+
+def summarize(values, confidence=0.95):
+    """Mean and percentiles of values, each with a bootstrap confidence interval"""
+    summary = {"n": len(values), "mean": mean(values), "ci": {}}
+    summary["ci"]["mean"] = bootstrap_ci(values, mean, confidence)
+    for q in PERCENTILES:
+        key = f"p{q}"
+        summary[key] = percentile(values, q)
+        summary["ci"][key] = bootstrap_ci(values, lambda sample, q=q: percentile(sample, q), confidence)
+    return summary
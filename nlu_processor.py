@@ -1,29 +1,69 @@
 import json
-import openai
+import random
+import threading
 from config import OPENAI_API_KEY, MODEL_NAME, MAX_TOKENS, TEMPERATURE
+from config import OPENAI_BASE_URL, NLU_CONCURRENCY, NLU_MAX_RETRIES, NLU_BACKOFF_BASE, NLU_BACKOFF_MAX
+from config import FAST_PARSER_ENABLED, FAST_PARSER_MIN_CONFIDENCE
+from parse_cache import get_cache, cache_key
+from fast_parser import fast_parse
+from tracing import span, traced, annotate
 import logging
 from datetime import datetime
 
-# Set up logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger('NLUProcessor')
 
-# Initialize OpenAI client
+# OpenAI client, created on first use so importing this module stays cheap
 client = None
-if OPENAI_API_KEY and OPENAI_API_KEY != "[Your OpenAI API Key Here]":
-    try:
-        client = openai.OpenAI(api_key=OPENAI_API_KEY)
-    except Exception as e:
-        logger.warning(f"Failed to initialize OpenAI client: {e}")
-        client = None
-else:
-    logger.warning("OpenAI client not initialized - API key missing or placeholder")
+_client_checked = False
+_client_lock = threading.Lock()
+
+def get_client():
+    """The OpenAI client, or None when no API key is configured"""
+    global client, _client_checked
+    with _client_lock:
+        if client is None and not _client_checked:
+            _client_checked = True
+            if OPENAI_API_KEY and OPENAI_API_KEY != "[Your OpenAI API Key Here]":
+                try:
+                    import openai
+                    client = openai.OpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL)
+                except Exception as e:
+                    logger.warning(f"Failed to initialize OpenAI client: {e}")
+            else:
+                logger.warning("OpenAI client not initialized - API key missing or placeholder")
+        return client
+
+SYSTEM_PROMPT = """
+You are TestSmith AI, an expert QA automation engineer. Your task is to analyze a user's natural language instruction and extract the key elements needed to write a Selenium test case in Python.
+
+Always respond **only** with a valid JSON object with the following exact structure:
+{
+  "test_name": "A concise, descriptive name for the test based on the instruction.",
+  "objective": "A one-sentence description of what the test should verify.",
+  "steps": [
+    {"action": "navigate", "url": "https://example.com/login"}
+  ]
+}
+
+If the instruction is ambiguous, make a reasonable assumption. Your goal is to always produce executable code.
+"""
+
+# Cache modes for parse_instruction
+CACHE_USE = "use"          # Serve hits, store misses
+CACHE_REFRESH = "refresh"  # Ignore hits, store fresh parses
+CACHE_OFF = "off"          # Bypass the cache entirely
 
 def parse_instruction_fallback(user_prompt):
     """
     Fallback parser for when OpenAI API is not available
     """
     logger.info("Using fallback parser (OpenAI not available)")
+
+    # Take whatever the rule-based parser understood, however unsure, over a bare homepage
+    parsed_data, confidence = fast_parse(user_prompt)
+    if confidence > 0:
+        parsed_data['timestamp'] = datetime.now().isoformat()
+        return parsed_data
     
     # Simple rule-based parser for common commands
     user_prompt_lower = user_prompt.lower()
@@ -66,48 +106,194 @@ def parse_instruction_fallback(user_prompt):
             "timestamp": datetime.now().isoformat()
         }
 
-def parse_instruction(user_prompt):
+def _fast_path(user_prompt):
+    """The rule-based parse of an instruction when it is confident enough to skip the LLM, else None"""
+    if not FAST_PARSER_ENABLED:
+        return None
+    parsed_data, confidence = fast_parse(user_prompt)
+    if confidence < FAST_PARSER_MIN_CONFIDENCE:
+        return None
+    parsed_data['timestamp'] = datetime.now().isoformat()
+    logger.info(f"Parsed instruction locally (confidence {confidence:.2f}): {user_prompt}")
+    return parsed_data
+
+def _chat_request(user_prompt):
+    """Chat completion arguments for parsing one instruction"""
+    return dict(
+        model=MODEL_NAME,
+        messages=[
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": user_prompt}
+        ],
+        max_tokens=MAX_TOKENS,
+        temperature=TEMPERATURE,
+        response_format={"type": "json_object"}
+    )
+
+def _record_usage(api_span, response):
+    """Attach token counts from a chat completion to its span"""
+    usage = getattr(response, 'usage', None)
+    if usage is not None:
+        api_span.set(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+
+@traced("nlu.parse")
+def parse_instruction(user_prompt, cache_mode=CACHE_USE):
     """
-    Parse natural language instruction into structured test steps
+    Parse natural language instruction into structured test steps.
+    Recognisable instructions are parsed locally by the rule-based fast
+    path; other parses are cached on disk, and a hit skips the OpenAI
+    request entirely.
     """
+    parsed_data = _fast_path(user_prompt)
+    if parsed_data is not None:
+        annotate(source="fast_path")
+        return parsed_data
+
+    key = cache_key(user_prompt, MODEL_NAME, TEMPERATURE, SYSTEM_PROMPT)
+    if cache_mode == CACHE_USE:
+        cached = get_cache().get(key)
+        if cached is not None:
+            cached['timestamp'] = datetime.now().isoformat()
+            annotate(cache="hit", source="cache")
+            logger.info(f"Using cached parse for instruction: {user_prompt}")
+            return cached
+    annotate(cache="off" if cache_mode == CACHE_OFF else "miss")
+
     # Try OpenAI first if available
+    client = get_client()
     if client:
         try:
-            SYSTEM_PROMPT = """
-You are TestSmith AI, an expert QA automation engineer. Your task is to analyze a user's natural language instruction and extract the key elements needed to write a Selenium test case in Python.
-
-Always respond **only** with a valid JSON object with the following exact structure:
-{
-  "test_name": "A concise, descriptive name for the test based on the instruction.",
-  "objective": "A one-sentence description of what the test should verify.",
-  "steps": [
-    {"action": "navigate", "url": "https://example.com/login"}
-  ]
-}
-
-If the instruction is ambiguous, make a reasonable assumption. Your goal is to always produce executable code.
-"""
-
-            response = client.chat.completions.create(
-                model=MODEL_NAME,
-                messages=[
-                    {"role": "system", "content": SYSTEM_PROMPT},
-                    {"role": "user", "content": user_prompt}
-                ],
-                max_tokens=MAX_TOKENS,
-                temperature=TEMPERATURE,
-                response_format={"type": "json_object"}
-            )
+            with span("nlu.api", model=MODEL_NAME) as api_span:
+                response = client.chat.completions.create(**_chat_request(user_prompt))
+                _record_usage(api_span, response)
             
             result = response.choices[0].message.content
             parsed_data = json.loads(result)
+            if cache_mode != CACHE_OFF:
+                get_cache().put(key, parsed_data)
             parsed_data['timestamp'] = datetime.now().isoformat()
+            annotate(source="openai")
             logger.info(f"Successfully parsed instruction using OpenAI: {user_prompt}")
             return parsed_data
             
         except Exception as e:
             logger.error(f"OpenAI parsing failed: {e}, using fallback")
+            annotate(source="fallback")
             return parse_instruction_fallback(user_prompt)
     else:
         # Use fallback parser
-        return parse_instruction_fallback(user_prompt)
\ No newline at end of file
+        annotate(source="fallback")
+        return parse_instruction_fallback(user_prompt)
+
+@traced("nlu.parse_batch")
+def parse_instructions(user_prompts, cache_mode=CACHE_USE, concurrency=NLU_CONCURRENCY):
+    """
+    Parse many instructions at once, returning results in input order.
+    Fast-path parses and cache hits are served locally; the rest are sent
+    to OpenAI concurrently, at most `concurrency` requests in flight,
+    backing off on rate limits.
+    """
+    results = [_fast_path(prompt) for prompt in user_prompts]
+    keys = [cache_key(prompt, MODEL_NAME, TEMPERATURE, SYSTEM_PROMPT) for prompt in user_prompts]
+    fast = sum(result is not None for result in results)
+
+    pending = []
+    for i, key in enumerate(keys):
+        if results[i] is not None:
+            continue
+        cached = get_cache().get(key) if cache_mode == CACHE_USE else None
+        if cached is not None:
+            cached['timestamp'] = datetime.now().isoformat()
+            results[i] = cached
+        else:
+            pending.append(i)
+
+    annotate(instructions=len(user_prompts), fast_path=fast, cache_hits=len(user_prompts) - fast - len(pending))
+    logger.info(f"Batch parse: {fast} parsed locally, {len(user_prompts) - fast - len(pending)} cached, "
+                f"{len(pending)} to parse")
+    if pending and get_client():
+        import asyncio
+        parsed = asyncio.run(_parse_concurrently([user_prompts[i] for i in pending], concurrency))
+        for i, parsed_data in zip(pending, parsed):
+            if parsed_data is None:
+                continue
+            if cache_mode != CACHE_OFF:
+                get_cache().put(keys[i], parsed_data)
+            parsed_data['timestamp'] = datetime.now().isoformat()
+            results[i] = parsed_data
+
+    for i in pending:
+        if results[i] is None:
+            results[i] = parse_instruction_fallback(user_prompts[i])
+    return results
+
+
+class _RateLimitGate:
+    """Shared cooldown so one 429 pauses every request, not just the one that hit it"""
+
+    def __init__(self):
+        self.resume_at = 0.0
+
+    async def wait(self):
+        """Sleep until no cooldown is in force; another 429 during the sleep extends it"""
+        import asyncio
+        while True:
+            delay = self.resume_at - asyncio.get_running_loop().time()
+            if delay <= 0:
+                return
+            await asyncio.sleep(delay)
+
+    def back_off(self, delay):
+        import asyncio
+        self.resume_at = max(self.resume_at, asyncio.get_running_loop().time() + delay)
+
+
+async def _parse_concurrently(user_prompts, concurrency):
+    """Send one chat completion per instruction; None marks a failed parse"""
+    import asyncio
+    import openai
+    async_client = openai.AsyncOpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL, max_retries=0)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    gate = _RateLimitGate()
+    try:
+        return await asyncio.gather(*(
+            _parse_with_retries(async_client, prompt, semaphore, gate) for prompt in user_prompts
+        ))
+    finally:
+        await async_client.close()
+
+async def _parse_with_retries(async_client, user_prompt, semaphore, gate):
+    import openai
+    for attempt in range(NLU_MAX_RETRIES + 1):
+        try:
+            async with semaphore:
+                # Checked once a slot is ours, right before sending, so queued requests see a 429 too
+                await gate.wait()
+                with span("nlu.api", model=MODEL_NAME, attempt=attempt + 1) as api_span:
+                    response = await async_client.chat.completions.create(**_chat_request(user_prompt))
+                    _record_usage(api_span, response)
+            parsed_data = json.loads(response.choices[0].message.content)
+            logger.info(f"Successfully parsed instruction using OpenAI: {user_prompt}")
+            return parsed_data
+        except openai.RateLimitError as e:
+            delay = _retry_delay(e, attempt)
+            logger.warning(f"Rate limited by OpenAI, retrying in {delay:.1f}s (attempt {attempt + 1})")
+            gate.back_off(delay)
+        except Exception as e:
+            logger.error(f"OpenAI parsing failed: {e}, using fallback")
+            return None
+
+    logger.error(f"Giving up on rate-limited instruction after {NLU_MAX_RETRIES} retries: {user_prompt}")
+    return None
+
+def _retry_delay(error, attempt):
+    """Honour the server's Retry-After header, else exponential backoff with jitter"""
+    response = getattr(error, 'response', None)
+    retry_after = response.headers.get('retry-after') if response is not None else None
+    try:
+        if retry_after is not None:
+            return min(float(retry_after), NLU_BACKOFF_MAX)
+    except ValueError:
+        pass
+    delay = NLU_BACKOFF_BASE * (2 ** attempt)
+    return min(delay * random.uniform(1.0, 1.5), NLU_BACKOFF_MAX)
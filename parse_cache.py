@@ -0,0 +1,122 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import logging
+from config import PARSE_CACHE_FILE, PARSE_CACHE_TTL, PARSE_CACHE_MAX_ENTRIES
+
+logger = logging.getLogger('ParseCache')
+
+# How many writes between TTL/size eviction passes
+PRUNE_INTERVAL = 100
+
+def normalize_instruction(instruction):
+    """Collapse whitespace so trivially different spellings share a cache entry"""
+    return " ".join(instruction.split())
+
+def cache_key(instruction, model, temperature, system_prompt):
+    """
+    Content address of a parse: the instruction plus everything that can change
+    the LLM's answer for it.
+    """
+    prompt_hash = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()
+    payload = json.dumps([normalize_instruction(instruction), model, temperature, prompt_hash])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ParseCache:
+    """
+    Persistent cache of parsed instructions in a SQLite file.
+    Entries expire `ttl` seconds after they were written, and the least
+    recently used entries are evicted beyond `max_entries`.
+    """
+
+    def __init__(self, path=PARSE_CACHE_FILE, ttl=PARSE_CACHE_TTL, max_entries=PARSE_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._conn = None
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS parses ("
+                " key TEXT PRIMARY KEY,"
+                " data TEXT NOT NULL,"
+                " created REAL NOT NULL,"
+                " last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS parses_last_used ON parses (last_used)")
+            self._conn.commit()
+        return self._conn
+
+    def get(self, key):
+        """Return the cached parse for key, or None on a miss or expired entry"""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT data, created FROM parses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            data, created = row
+            if self.ttl and now - created > self.ttl:
+                conn.execute("DELETE FROM parses WHERE key = ?", (key,))
+                conn.commit()
+                return None
+            conn.execute("UPDATE parses SET last_used = ? WHERE key = ?", (now, key))
+            conn.commit()
+        return json.loads(data)
+
+    def put(self, key, parsed_data):
+        """Store a parse result under key"""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO parses (key, data, created, last_used) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(parsed_data), now, now)
+            )
+            conn.commit()
+            self._writes += 1
+            prune_due = self._writes % PRUNE_INTERVAL == 0
+        if prune_due:
+            self.prune()
+
+    def prune(self):
+        """Drop expired entries, then the least recently used ones beyond max_entries"""
+        with self._lock:
+            conn = self._connect()
+            if self.ttl:
+                conn.execute("DELETE FROM parses WHERE created < ?", (time.time() - self.ttl,))
+            if self.max_entries:
+                conn.execute(
+                    "DELETE FROM parses WHERE key IN ("
+                    " SELECT key FROM parses ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+            conn.commit()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    """Return the process-wide parse cache"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ParseCache()
+        return _cache
@@ -0,0 +1,192 @@
+"""
+Streaming pipeline for large suites (main.py --file FILE --pipeline).
+
+Instructions are read lazily, one line at a time, and flow through the
+parse, generate and execute stages to a single report writer. Each stage
+has its own pool of threads, sized for its work (many concurrent LLM calls,
+a few browsers), and hands items to the next stage through a bounded queue.
+When a stage falls behind its queue fills up and the stage before it
+blocks, so at most a few queues' worth of instructions are in flight and a
+suite of any size runs in constant memory. The writer records each result
+as soon as it is executed instead of waiting for the batch to end.
+"""
+
+import queue
+import sys
+import threading
+import time
+import logging
+from config import (MANIFEST_FRESHNESS_HOURS, RETRY_MAX_RETRIES, PIPELINE_QUEUE_SIZE, PIPELINE_PARSE_WORKERS,
+                    PIPELINE_GENERATE_WORKERS, PIPELINE_EXECUTE_WORKERS)
+from nlu_processor import parse_instruction, CACHE_USE
+from test_generator import generate_test_code
+from run_manifest import get_manifest
+from test_history import RetryPolicy, is_flaky_pass
+import fixture_server
+import tracing
+
+logger = logging.getLogger('Pipeline')
+
+# Sent down the queues after the last instruction
+_DONE = object()
+
+
+def read_instructions(source):
+    """
+    Iterate over the non-empty lines of source without reading it whole;
+    "-" reads stdin. The file is opened right away, so a missing one fails
+    here rather than once the pipeline is running.
+    """
+    f = sys.stdin if source == "-" else open(source, 'r', encoding='utf-8')
+    return _lines(f)
+
+def _lines(f):
+    try:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield line
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+class _Item:
+    """One instruction on its way through the stages"""
+
+    def __init__(self, instruction):
+        self.instruction = instruction
+        self.parsed_data = None
+        self.parse_ms = None
+        self.test_code = None
+        self.code_path = None
+        self.generate_ms = None
+        # Set once the item needs no further stages: executed, reused or failed
+        self.entry = None
+        self.reused = False
+
+
+class _Stage:
+    """
+    `workers` threads taking items from inbox, applying handle and putting
+    them on outbox. Finished items pass straight through; an item whose
+    handle raises becomes an ERROR entry.
+    """
+
+    def __init__(self, name, handle, workers, inbox, outbox):
+        self.name = name
+        self.handle = handle
+        self.inbox = inbox
+        self.outbox = outbox
+        self._running = workers
+        self._lock = threading.Lock()
+        self._threads = [threading.Thread(target=self._run, name=f"pipeline-{name}-{i}", daemon=True)
+                         for i in range(workers)]
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            item = self.inbox.get()
+            if item is _DONE:
+                # Leave it for the other workers; the last one passes it on
+                self.inbox.put(_DONE)
+                with self._lock:
+                    self._running -= 1
+                    last = self._running == 0
+                if last:
+                    self.outbox.put(_DONE)
+                return
+            if item.entry is None:
+                try:
+                    with tracing.span(f"pipeline.{self.name}", instruction=item.instruction):
+                        self.handle(item)
+                except Exception as e:
+                    from main import error_entry
+                    logger.error(f"{self.name} failed for '{item.instruction}': {e}")
+                    item.entry = error_entry(item.instruction, str(e))
+            self.outbox.put(item)
+
+
+def run_pipeline(instructions, executor=None, cache_mode=CACHE_USE, incremental=False,
+                 freshness=MANIFEST_FRESHNESS_HOURS, retries=RETRY_MAX_RETRIES,
+                 parse_workers=PIPELINE_PARSE_WORKERS, generate_workers=PIPELINE_GENERATE_WORKERS,
+                 execute_workers=PIPELINE_EXECUTE_WORKERS, queue_size=PIPELINE_QUEUE_SIZE):
+    """
+    Run an iterable of instructions through the pipeline, recording each
+    result as it completes. Results arrive in completion order, not input
+    order. Returns {"total", "passed", "flaky", "reused"} counts.
+    An error reading the instructions (e.g. a decode error halfway through
+    a file) is raised once the instructions read before it have finished.
+    """
+    from main import execute_with_retries, make_entry, record_entry, _reuse_entry, _elapsed_ms
+
+    # The batch size isn't known up front, so the retry budget grows as instructions are read
+    retry_policy = RetryPolicy(retries)
+
+    def parse(item):
+        if incremental:
+            reused = get_manifest().reusable([item.instruction], freshness)
+            if reused:
+                item.entry, item.reused = reused[item.instruction], True
+                return
+        start = time.perf_counter()
+        item.parsed_data = parse_instruction(item.instruction, cache_mode=cache_mode)
+        item.parse_ms = _elapsed_ms(start)
+
+    def generate(item):
+        # No-op unless --fixtures started the fixture server
+        item.parsed_data = fixture_server.rewrite_parsed(item.parsed_data)
+        start = time.perf_counter()
+        item.test_code, item.code_path = generate_test_code(item.parsed_data)
+        item.generate_ms = _elapsed_ms(start)
+
+    def execute(item):
+        start = time.perf_counter()
+        result = execute_with_retries(item.instruction, item.parsed_data, item.test_code, item.code_path,
+                                      executor, retry_policy)
+        item.entry = make_entry(item.instruction, item.parsed_data, result, item.parse_ms, item.generate_ms,
+                                _elapsed_ms(start))
+
+    to_parse, to_generate, to_execute, to_report = (queue.Queue(maxsize=queue_size) for _ in range(4))
+    _Stage("parse", parse, parse_workers, to_parse, to_generate).start()
+    _Stage("generate", generate, generate_workers, to_generate, to_execute).start()
+    _Stage("execute", execute, execute_workers, to_execute, to_report).start()
+
+    reader_errors = []
+
+    def feed():
+        try:
+            for instruction in instructions:
+                retry_policy.admit(instruction)
+                # Blocks while the parse stage is behind
+                to_parse.put(_Item(instruction))
+        except Exception as e:
+            logger.error(f"Stopped reading instructions: {e}")
+            reader_errors.append(e)
+        finally:
+            to_parse.put(_DONE)
+    threading.Thread(target=feed, name="pipeline-reader", daemon=True).start()
+
+    # The report writer: this thread, so results are recorded one at a time
+    counts = {"total": 0, "passed": 0, "flaky": 0, "reused": 0}
+    while True:
+        item = to_report.get()
+        if item is _DONE:
+            break
+        if item.reused:
+            entry = _reuse_entry(item.entry)
+            counts["reused"] += 1
+        else:
+            entry = item.entry
+            record_entry(entry)
+        counts["total"] += 1
+        counts["passed"] += entry["status"] == "PASS"
+        counts["flaky"] += is_flaky_pass(entry)
+        print(f"[{counts['total']}] {entry['test_name']}: {entry['status']}")
+    if reader_errors:
+        raise reader_errors[0]
+    return counts
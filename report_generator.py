@@ -1,97 +1,166 @@
-import json
 import os
 from datetime import datetime
-from config import REPORTS_DIR
-import openpyxl
-from openpyxl import Workbook
+from config import REPORTS_DIR, EXCEL_SPLIT_BY, EXCEL_MAX_ROWS_PER_FILE, EXCEL_WIDTH_SAMPLE_ROWS
+from result_store import get_store, iter_results
+from test_history import is_flaky_pass
+from tracing import traced
 import logging
 
 logger = logging.getLogger('ReportGenerator')
 
+@traced("report.write")
 def add_to_report(report_entry):
     """
-    Add a test result to the JSON report
+    Append a test result to the result log
     """
-    # Ensure reports directory exists
-    os.makedirs(REPORTS_DIR, exist_ok=True)
-    
-    report_file = os.path.join(REPORTS_DIR, 'test_results.json')
-    
-    # Load existing report or create new one
-    if os.path.exists(report_file):
-        with open(report_file, 'r') as f:
-            try:
-                report_data = json.load(f)
-            except json.JSONDecodeError:
-                report_data = {"results": []}
-    else:
-        report_data = {"results": []}
-    
-    # Add new entry
-    report_data["results"].append(report_entry)
-    
-    # Save updated report
-    with open(report_file, 'w') as f:
-        json.dump(report_data, f, indent=2)
+    get_store().append(report_entry)
     
     logger.info(f"Added test result to report: {report_entry['test_name']} - {report_entry['status']}")
 
-def generate_excel_report(results=None):
+# Report columns and the result fields they come from
+EXCEL_COLUMNS = [
+    ("Test Name", "test_name"),
+    ("Description", "description"),
+    ("Status", "status"),
+    ("Outcome", "outcome"),
+    ("Attempts", "attempts"),
+    ("Flakiness", "flakiness"),
+    ("Error", "error"),
+    ("Screenshot", "screenshot_link"),
+    ("Generated Code", "generated_code_link"),
+    ("Timestamp", "timestamp"),
+    ("Parse (ms)", "parse_ms"),
+    ("Generate (ms)", "generate_ms"),
+    ("Execute (ms)", "execute_ms"),
+    ("Step Timings (ms)", "step_timings"),
+]
+
+def generate_excel_report(results=None, split_by=EXCEL_SPLIT_BY):
     """
-    Generate an Excel report from the JSON results
+    Generate an Excel report from the given results, or the whole result log.
+    Returns the path of the first workbook written.
+    """
+    excel_files = generate_excel_reports(results, split_by=split_by)
+    return excel_files[0] if excel_files else None
+
+def generate_excel_reports(results=None, split_by=EXCEL_SPLIT_BY, max_rows_per_file=EXCEL_MAX_ROWS_PER_FILE):
+    """
+    Stream results into write-only workbooks in a single pass.
+    results may be any iterable, including a generator over the result log.
+    Rows go to one sheet per run or date (split_by="run"/"date", or None for
+    a single sheet), and a new file is started every max_rows_per_file rows.
+    Returns the list of workbook paths.
     """
     if results is None:
-        # Load from JSON file
-        report_file = os.path.join(REPORTS_DIR, 'test_results.json')
-        if not os.path.exists(report_file):
-            logger.error("No JSON report found to convert to Excel")
-            return
-        
-        with open(report_file, 'r') as f:
-            report_data = json.load(f)
-        results = report_data.get("results", [])
-    
-    if not results:
-        logger.warning("No results to generate Excel report")
-        return
-    
-    # Create Excel workbook
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Test Results"
-    
-    # Add headers
-    headers = ["Test Name", "Description", "Status", "Error", "Screenshot", "Generated Code", "Timestamp"]
-    for col, header in enumerate(headers, 1):
-        ws.cell(row=1, column=col, value=header)
-    
-    # Add data
-    for row, result in enumerate(results, 2):
-        ws.cell(row=row, column=1, value=result.get('test_name', ''))
-        ws.cell(row=row, column=2, value=result.get('description', ''))
-        ws.cell(row=row, column=3, value=result.get('status', ''))
-        ws.cell(row=row, column=4, value=result.get('error', ''))
-        ws.cell(row=row, column=5, value=result.get('screenshot_link', ''))
-        ws.cell(row=row, column=6, value=result.get('generated_code_link', ''))
-        ws.cell(row=row, column=7, value=result.get('timestamp', ''))
-    
-    # Auto-adjust column widths
-    for column in ws.columns:
-        max_length = 0
-        column_letter = column[0].column_letter
-        for cell in column:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = min(max_length + 2, 50)
-        ws.column_dimensions[column_letter].width = adjusted_width
-    
-    # Save file
+        # Stream from the result log
+        get_store().flush()
+        results = iter_results()
+
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    excel_file = os.path.join(REPORTS_DIR, f'test_results_{timestamp}.xlsx')
-    wb.save(excel_file)
-    
-    logger.info(f"Excel report generated: {excel_file}")
-    return excel_file
\ No newline at end of file
+    excel_files = []
+    workbook = None
+
+    for result in results:
+        if workbook is None or workbook.rows >= max_rows_per_file:
+            if workbook is not None:
+                excel_files.append(workbook.save())
+            part = f"_part{len(excel_files) + 1}" if excel_files else ""
+            workbook = _StreamingWorkbook(os.path.join(REPORTS_DIR, f'test_results_{timestamp}{part}.xlsx'))
+        workbook.append(_sheet_key(result, split_by), result)
+
+    if workbook is None:
+        logger.warning("No results to generate Excel report")
+        return []
+
+    excel_files.append(workbook.save())
+    return excel_files
+
+def _cell_value(result, field):
+    if field == 'outcome':
+        # Tells passes that needed a retry apart from clean ones
+        if result.get('status') != "PASS":
+            return result.get('status', '')
+        return "Flaky pass" if is_flaky_pass(result) else "Pass"
+    value = result.get(field)
+    if value is None:
+        return ''
+    if field == 'flakiness':
+        return round(value, 2)
+    if field == 'step_timings':
+        # e.g. "1 navigate 812.4; 2 click 35.0"
+        return '; '.join(f"{i} {step['action']} {step['ms']}" for i, step in enumerate(value, 1))
+    return value
+
+def _sheet_key(result, split_by):
+    if split_by == "run":
+        return f"Run {result.get('run_id') or 'unknown'}"
+    if split_by == "date":
+        return (result.get('timestamp') or '')[:10] or "Undated"
+    return "Test Results"
+
+
+class _StreamingWorkbook:
+    """
+    A write-only openpyxl workbook that never holds more than a bounded
+    sample of rows in memory.
+    Write-only sheets need their column widths before the first row is
+    written, so each sheet buffers its first EXCEL_WIDTH_SAMPLE_ROWS rows,
+    growing the widths row by row, then streams everything after.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+        # openpyxl is only imported once a report is actually written
+        from openpyxl import Workbook
+        self._workbook = Workbook(write_only=True)
+        self._sheets = {}
+
+    def append(self, key, result):
+        sheet = self._sheets.get(key)
+        if sheet is None:
+            sheet = self._sheets[key] = _StreamingSheet(self._workbook.create_sheet(_sheet_title(key)))
+        sheet.append([_cell_value(result, field) for _, field in EXCEL_COLUMNS])
+        self.rows += 1
+
+    def save(self):
+        for sheet in self._sheets.values():
+            sheet.flush()
+        self._workbook.save(self.path)
+        logger.info(f"Excel report generated: {self.path} ({self.rows} rows)")
+        return self.path
+
+
+class _StreamingSheet:
+    def __init__(self, worksheet):
+        self._worksheet = worksheet
+        self._widths = [len(header) for header, _ in EXCEL_COLUMNS]
+        self._sample = []
+
+    def append(self, row):
+        if self._sample is None:
+            self._worksheet.append(row)
+            return
+        for i, value in enumerate(row):
+            self._widths[i] = max(self._widths[i], len(str(value)))
+        self._sample.append(row)
+        if len(self._sample) >= EXCEL_WIDTH_SAMPLE_ROWS:
+            self.flush()
+
+    def flush(self):
+        """Fix the column widths and write out the buffered sample"""
+        if self._sample is None:
+            return
+        from openpyxl.utils import get_column_letter
+        for i, width in enumerate(self._widths, 1):
+            self._worksheet.column_dimensions[get_column_letter(i)].width = min(width + 2, 50)
+        self._worksheet.append([header for header, _ in EXCEL_COLUMNS])
+        for row in self._sample:
+            self._worksheet.append(row)
+        self._sample = None
+
+
+def _sheet_title(key):
+    # Excel sheet names are limited to 31 characters and may not contain []:*?/\
+    title = ''.join('_' if c in '[]:*?/\\' else c for c in str(key))
+    return title[:31]
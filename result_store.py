@@ -0,0 +1,205 @@
+import atexit
+import json
+import os
+import threading
+import time
+import logging
+from collections import deque
+from contextlib import contextmanager
+from config import REPORTS_DIR, RESULT_STORE_FSYNC_EVERY, RESULT_STORE_FSYNC_INTERVAL
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger('ResultStore')
+
+RESULTS_FILE = os.path.join(REPORTS_DIR, 'test_results.jsonl')
+LEGACY_RESULTS_FILE = os.path.join(REPORTS_DIR, 'test_results.json')
+
+
+@contextmanager
+def _exclusive_lock(path):
+    """
+    Hold an exclusive OS lock on path + '.lock' so writers in other
+    processes don't interleave with appends or a compaction. Creates
+    path's directory if needed.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.lock', 'a+') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class ResultStore:
+    """
+    Append-only, line-delimited log of test results.
+    Each entry is one JSON line written with a single append, so concurrent
+    writers never corrupt each other. fsync is batched: every `fsync_every`
+    entries or `fsync_interval` seconds, whichever comes first.
+    """
+
+    def __init__(self, path=RESULTS_FILE, fsync_every=RESULT_STORE_FSYNC_EVERY,
+                 fsync_interval=RESULT_STORE_FSYNC_INTERVAL):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._fd = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._lock = threading.Lock()
+
+    def append(self, entry):
+        """Append one result entry"""
+        line = (json.dumps(entry) + "\n").encode("utf-8")
+        with self._lock, _exclusive_lock(self.path):
+            fd = self._open()
+            os.write(fd, line)
+            self._unsynced += 1
+            if (self._unsynced >= self.fsync_every
+                    or time.monotonic() - self._last_sync >= self.fsync_interval):
+                self._sync()
+
+    def flush(self):
+        """fsync any entries appended since the last sync"""
+        with self._lock:
+            if self._fd is not None and self._unsynced:
+                self._sync()
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+    def _open(self):
+        # A compaction replaces the file; reopen so appends land in the new one
+        if self._fd is not None:
+            try:
+                replaced = os.fstat(self._fd).st_ino != os.stat(self.path).st_ino
+            except FileNotFoundError:
+                replaced = True
+            if replaced:
+                os.close(self._fd)
+                self._fd = None
+        if self._fd is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        return self._fd
+
+    def _sync(self):
+        os.fsync(self._fd)
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+
+def iter_results(path=RESULTS_FILE, run_id=None):
+    """
+    Stream result entries in the order they were written, one line at a time,
+    optionally only those of run_id.
+    Truncated or corrupt lines (e.g. from a crash mid-write) are skipped.
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning(f"Skipping corrupt result on line {line_number} of {path}")
+                continue
+            if run_id is None or entry.get("run_id") == run_id:
+                yield entry
+
+def compact(path=RESULTS_FILE, max_entries=None):
+    """
+    Rewrite the result log without corrupt lines, optionally keeping only the
+    newest max_entries results. Returns the number of entries kept.
+    """
+    if not os.path.exists(path):
+        return 0
+
+    get_store().flush()
+    tmp_path = path + '.compact'
+    with _exclusive_lock(path):
+        entries = iter_results(path)
+        if max_entries is not None:
+            entries = deque(entries, maxlen=max_entries)
+        kept = 0
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + "\n")
+                kept += 1
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    logger.info(f"Compacted {path}: {kept} entries kept")
+    return kept
+
+def migrate_legacy_report(legacy_path=LEGACY_RESULTS_FILE, path=RESULTS_FILE):
+    """
+    Move entries from the old read-modify-write JSON report into the log.
+    The JSON file is renamed to *.migrated so this runs only once.
+    """
+    if not os.path.exists(legacy_path):
+        return 0
+
+    with _exclusive_lock(path):
+        # Another process may have migrated it while we waited for the lock
+        if not os.path.exists(legacy_path):
+            return 0
+        with open(legacy_path, 'r') as f:
+            try:
+                legacy_results = json.load(f).get("results", [])
+            except json.JSONDecodeError:
+                logger.error(f"Legacy report {legacy_path} is corrupt; leaving it in place")
+                return 0
+
+        # Legacy results predate anything in the log, so they go first
+        tmp_path = path + '.migrate'
+        with open(tmp_path, 'w', encoding='utf-8') as out:
+            for entry in legacy_results:
+                out.write(json.dumps(entry) + "\n")
+            if os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as current:
+                    for line in current:
+                        out.write(line)
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp_path, path)
+        os.replace(legacy_path, legacy_path + '.migrated')
+
+    logger.info(f"Migrated {len(legacy_results)} results from {legacy_path}")
+    return len(legacy_results)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store():
+    """Return the process-wide result store, migrating a legacy JSON report first"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            migrate_legacy_report()
+            _store = ResultStore()
+            atexit.register(_store.close)
+        return _store
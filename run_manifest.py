@@ -0,0 +1,153 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import logging
+from config import MANIFEST_FILE, MODEL_NAME, TEMPERATURE
+from parse_cache import cache_key, normalize_instruction
+
+logger = logging.getLogger('RunManifest')
+
+# Sources whose changes alter what a generated test does when run; fast_parser
+# parses without touching the parse key, so its rules count too
+PIPELINE_SOURCES = ("fast_parser.py", "test_generator.py", "step_runtime.py")
+
+def instruction_hash(instruction):
+    return hashlib.sha256(normalize_instruction(instruction).encode("utf-8")).hexdigest()
+
+def parse_key(instruction):
+    """Parse cache key for an instruction under the current model and prompt"""
+    from nlu_processor import SYSTEM_PROMPT
+    return cache_key(instruction, MODEL_NAME, TEMPERATURE, SYSTEM_PROMPT)
+
+_pipeline_version = None
+
+def pipeline_version():
+    """
+    Hash of the fast parser, generator and step runtime sources, plus the fixture mode
+    tests run against; a change means earlier results no longer apply.
+    """
+    global _pipeline_version
+    if _pipeline_version is None:
+        digest = hashlib.sha256()
+        directory = os.path.dirname(os.path.abspath(__file__))
+        for source in PIPELINE_SOURCES:
+            with open(os.path.join(directory, source), 'rb') as f:
+                digest.update(f.read())
+        _pipeline_version = digest.hexdigest()
+    from fixture_server import get_fixture_server
+    server = get_fixture_server()
+    return f"{_pipeline_version[:16]}:{server.mode if server else 'live'}"
+
+
+class RunManifest:
+    """
+    Remembers, per instruction, the inputs of its last run (parse key,
+    pipeline version), the artifact it produced and the result, so an
+    incremental run can skip instructions whose inputs are unchanged.
+    """
+
+    def __init__(self, path=MANIFEST_FILE):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS manifest ("
+                " instruction_hash TEXT PRIMARY KEY,"
+                " instruction TEXT NOT NULL,"
+                " parse_key TEXT NOT NULL,"
+                " pipeline_version TEXT NOT NULL,"
+                " artifact TEXT,"
+                " status TEXT NOT NULL,"
+                " duration_ms REAL,"
+                " last_run REAL NOT NULL,"
+                " entry TEXT NOT NULL)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def record(self, entry):
+        """Store the result of running entry["instruction"]"""
+        instruction = entry.get("instruction")
+        if not instruction:
+            return
+        durations = [entry.get(field) for field in ("parse_ms", "generate_ms", "execute_ms")]
+        duration_ms = sum(d or 0 for d in durations) if entry.get("execute_ms") is not None else None
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO manifest (instruction_hash, instruction, parse_key, pipeline_version,"
+                " artifact, status, duration_ms, last_run, entry) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (instruction_hash(instruction), instruction, parse_key(instruction), pipeline_version(),
+                 entry.get("generated_code_link") or None, entry["status"], duration_ms, time.time(),
+                 json.dumps(entry, default=str))
+            )
+            conn.commit()
+
+    def _rows(self, instructions):
+        hashes = sorted({instruction_hash(instruction) for instruction in instructions})
+        rows = {}
+        with self._lock:
+            conn = self._connect()
+            # Chunked to stay under SQLite's bound-parameter limit
+            for start in range(0, len(hashes), 500):
+                chunk = hashes[start:start + 500]
+                for row in conn.execute(
+                        "SELECT instruction_hash, parse_key, pipeline_version, artifact, status, last_run, entry"
+                        f" FROM manifest WHERE instruction_hash IN ({','.join('?' * len(chunk))})", chunk):
+                    rows[row[0]] = row
+        return rows
+
+    def reusable(self, instructions, freshness_hours):
+        """
+        Map each instruction that needs no rerun to its last report entry:
+        it passed within freshness_hours, with the same parse key and
+        pipeline version, and its artifact still exists.
+        """
+        rows = self._rows(instructions)
+        version = pipeline_version()
+        cutoff = time.time() - freshness_hours * 3600
+        reused = {}
+        for instruction in instructions:
+            row = rows.get(instruction_hash(instruction))
+            if row is None:
+                continue
+            _, key, row_version, artifact, status, last_run, entry = row
+            if (status == "PASS" and key == parse_key(instruction) and row_version == version
+                    and last_run >= cutoff and artifact and os.path.exists(artifact)):
+                reused[instruction] = json.loads(entry)
+        return reused
+
+    def failed_first(self, instructions):
+        """
+        Reorder instructions: last run failed or errored first, then ones
+        never run, then the rest; input order is kept within each group.
+        """
+        rows = self._rows(instructions)
+
+        def rank(instruction):
+            row = rows.get(instruction_hash(instruction))
+            if row is None:
+                return 1
+            return 0 if row[4] != "PASS" else 2
+        return sorted(instructions, key=rank)
+
+
+_manifest = None
+_manifest_lock = threading.Lock()
+
+def get_manifest():
+    """Return the process-wide run manifest"""
+    global _manifest
+    with _manifest_lock:
+        if _manifest is None:
+            _manifest = RunManifest()
+        return _manifest
@@ -0,0 +1,121 @@
+"""
+Failure screenshots, stored once per distinct image.
+
+capture() only grabs the PNG bytes from the browser and returns the final
+path right away. The path is content-addressed by the SHA-256 of the
+capture, so identical screenshots share a file and parallel failures never
+collide. Encoding (WebP or optimized PNG, optionally downscaled, when
+Pillow is installed) happens on a background thread. Pending writes are
+flushed before the process exits.
+"""
+
+import atexit
+import hashlib
+import io
+import os
+import queue
+import threading
+import logging
+from config import SCREENSHOTS_DIR, SCREENSHOT_FORMAT, SCREENSHOT_QUALITY, SCREENSHOT_MAX_WIDTH
+
+logger = logging.getLogger('ScreenshotManager')
+
+_jobs = queue.Queue()
+_pending = set()
+_pending_lock = threading.Lock()
+_encoder = None
+_encoder_lock = threading.Lock()
+_pillow = None
+
+
+def _image_module():
+    """PIL.Image, imported on first use; None when Pillow is not installed"""
+    global _pillow
+    if _pillow is None:
+        try:
+            from PIL import Image
+            _pillow = Image
+        except ImportError:
+            _pillow = False
+    return _pillow or None
+
+def _extension():
+    # Without Pillow the captured PNG is stored as is
+    return SCREENSHOT_FORMAT if _image_module() is not None else "png"
+
+def screenshot_path(png):
+    """Where a capture with these bytes is stored"""
+    digest = hashlib.sha256(png).hexdigest()
+    return os.path.join(SCREENSHOTS_DIR, digest[:2], f"{digest[:24]}.{_extension()}")
+
+def capture(driver):
+    """
+    Grab a screenshot and queue it for encoding; returns its path, or ""
+    if the browser could not take one.
+    """
+    try:
+        png = driver.get_screenshot_as_png()
+    except Exception as e:
+        logger.warning(f"Failed to capture screenshot: {e}")
+        return ""
+
+    path = screenshot_path(png)
+    with _pending_lock:
+        if path in _pending or os.path.exists(path):
+            return path
+        _pending.add(path)
+    _ensure_encoder()
+    _jobs.put((path, png))
+    return path
+
+def flush():
+    """Wait until every queued screenshot is on disk"""
+    if _encoder is not None:
+        _jobs.join()
+
+def _ensure_encoder():
+    global _encoder
+    with _encoder_lock:
+        if _encoder is None:
+            _encoder = threading.Thread(target=_encode_loop, name="screenshot-encoder", daemon=True)
+            _encoder.start()
+            atexit.register(flush)
+
+def _encode_loop():
+    while True:
+        path, png = _jobs.get()
+        try:
+            _write(path, _encode(png))
+        except Exception as e:
+            logger.error(f"Failed to write screenshot {path}: {e}")
+        finally:
+            with _pending_lock:
+                _pending.discard(path)
+            _jobs.task_done()
+
+def _encode(png):
+    Image = _image_module()
+    if Image is None:
+        return png
+    try:
+        image = Image.open(io.BytesIO(png))
+        image.load()
+    except Exception as e:
+        logger.warning(f"Could not decode screenshot, storing it as captured: {e}")
+        return png
+    if SCREENSHOT_MAX_WIDTH and image.width > SCREENSHOT_MAX_WIDTH:
+        height = round(image.height * SCREENSHOT_MAX_WIDTH / image.width)
+        image = image.resize((SCREENSHOT_MAX_WIDTH, height), Image.LANCZOS)
+    out = io.BytesIO()
+    if SCREENSHOT_FORMAT == "webp":
+        image.save(out, format="WEBP", quality=SCREENSHOT_QUALITY, method=4)
+    else:
+        image.save(out, format="PNG", optimize=True)
+    return out.getvalue()
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
@@ -0,0 +1,407 @@
+"""
+Shared runtime for generated tests.
+
+test_generator emits each test as compact step data (JSON); this module
+turns a step list into calls once and runs it against a pooled browser.
+Sessions have no implicit wait: each step waits explicitly for its element
+with adaptive polling, and gives up early once the page has settled.
+Run a generated test standalone with:
+
+    python step_runtime.py test_cases/test_<name>_<timestamp>.json
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+
+# Allow running as a script from any working directory
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import (STEP_TIMEOUTS, STEP_LOCATOR_GRACE, STEP_POLL_INITIAL, STEP_POLL_MAX,
+                    STEP_POLL_BACKOFF, PAGE_NETWORK_IDLE)
+from driver_pool import borrow_driver
+import screenshot_manager
+from tracing import span
+
+logger = logging.getLogger('StepRuntime')
+
+# When set, the runtime writes step and result events to this JSON-lines file
+RESULT_FILE_ENV = "TESTSMITH_RESULT_FILE"
+
+
+def _by(step):
+    """Map a step's locator strategy ("id", "css selector", ...) to a By value"""
+    from selenium.webdriver.common.by import By
+    return getattr(By, step.get('by', 'id').upper().replace(' ', '_'))
+
+class _PageState:
+    """
+    Tracks how long the current page has been quiet: document.readyState is
+    "complete" and no new resources have loaded (resource-timing count as a
+    network-idle approximation).
+    """
+
+    _PROBE = "return [document.readyState, performance.getEntriesByType('resource').length]"
+
+    def __init__(self):
+        self._last = None
+        self._quiet_since = None
+
+    def quiet_for(self, driver):
+        """Seconds the page has been loaded with no new requests; 0 while it is still loading"""
+        try:
+            state = tuple(driver.execute_script(self._PROBE))
+        except Exception:
+            return 0.0
+        now = time.monotonic()
+        if state != self._last:
+            self._last = state
+            self._quiet_since = now
+        return now - self._quiet_since if state[0] == "complete" else 0.0
+
+def poll(driver, probe, timeout, grace=None):
+    """
+    Call probe(driver) until it returns something other than None.
+    Polls start at STEP_POLL_INITIAL and back off to STEP_POLL_MAX. With a
+    grace period, give up early once the page has been quiet for grace
+    seconds (and at least PAGE_NETWORK_IDLE): nothing still loading will
+    satisfy the probe. Returns (result, reason), reason being "timeout" or
+    "settled" on failure.
+    """
+    deadline = time.monotonic() + timeout
+    interval = STEP_POLL_INITIAL
+    page = _PageState()
+    while True:
+        result = probe(driver)
+        if result is not None:
+            return result, None
+        if grace is not None and page.quiet_for(driver) >= max(grace, PAGE_NETWORK_IDLE):
+            return None, "settled"
+        now = time.monotonic()
+        if now >= deadline:
+            return None, "timeout"
+        time.sleep(min(interval, deadline - now))
+        interval = min(interval * STEP_POLL_BACKOFF, STEP_POLL_MAX)
+
+def _step_timeout(step):
+    return step.get('timeout', STEP_TIMEOUTS.get(step.get('action'), STEP_TIMEOUTS['default']))
+
+def _not_found(locator, reason, timeout):
+    from selenium.common.exceptions import NoSuchElementException, TimeoutException
+    if reason == "settled":
+        return NoSuchElementException(f"Element not found after page settled ({STEP_LOCATOR_GRACE}s grace): {locator}")
+    return TimeoutException(f"Element not found within {timeout} seconds: {locator}")
+
+def _first(by, locator, accept=None):
+    """Probe returning the first matching element (that passes accept), or None"""
+    def probe(driver):
+        for element in driver.find_elements(by, locator):
+            try:
+                if accept is None or accept(element):
+                    return element
+            except Exception:
+                # Stale or detached element: look again on the next poll
+                return None
+        return None
+    return probe
+
+def _find(step, accept=None):
+    """Locate a step's element, failing fast once the page has settled without it"""
+    by, locator, timeout = _by(step), step.get('locator', ''), _step_timeout(step)
+
+    def find(driver):
+        element, reason = poll(driver, _first(by, locator, accept), timeout, grace=STEP_LOCATOR_GRACE)
+        if element is None:
+            raise _not_found(locator, reason, timeout)
+        return element
+    return find
+
+def _navigate(step):
+    url = step.get('url', '')
+    return lambda driver: driver.get(url)
+
+def _click(step):
+    find = _find(step, accept=lambda element: element.is_displayed() and element.is_enabled())
+    return lambda driver: find(driver).click()
+
+def _input(step):
+    find, text = _find(step, accept=lambda element: element.is_displayed()), step.get('text', '')
+    return lambda driver: find(driver).send_keys(text)
+
+def _verify(step):
+    by, locator, expected = _by(step), step.get('locator', ''), step.get('expected', '')
+    matches = _find(step, accept=lambda element: expected in element.text)
+
+    def verify(driver):
+        try:
+            matches(driver)
+        except Exception:
+            # Report what the element says when it exists, otherwise that it is missing
+            elements = driver.find_elements(by, locator)
+            if not elements:
+                raise
+            raise AssertionError(f"Verification failed. Expected: {expected}, Got: {elements[0].text}") from None
+    return verify
+
+def _verify_title(step):
+    expected, timeout = step.get('expected', ''), _step_timeout(step)
+
+    def verify_title(driver):
+        # The title can still change while the page finishes loading
+        title, _ = poll(driver, lambda driver: driver.title if expected in driver.title else None,
+                        timeout, grace=STEP_LOCATOR_GRACE)
+        if title is None:
+            raise AssertionError(f"Title verification failed. Expected: {expected}, Got: {driver.title}")
+    return verify_title
+
+def _wait(step):
+    by, locator, timeout = _by(step), step.get('locator', ''), _step_timeout(step)
+
+    def wait(driver):
+        # An explicit wait is asked for, so it runs to its timeout without the settled grace
+        element, reason = poll(driver, _first(by, locator), timeout)
+        if element is None:
+            raise _not_found(locator, reason, timeout)
+        print(f"Element found: {locator}")
+    return wait
+
+def _unknown(step):
+    action = step.get('action', '')
+    return lambda driver: print(f"Unknown action: {action}")
+
+STEP_COMPILERS = {
+    'navigate': _navigate,
+    'click': _click,
+    'input': _input,
+    'verify': _verify,
+    'verify_title': _verify_title,
+    'wait': _wait,
+}
+
+def compile_steps(steps):
+    """Turn step dicts into (action, callable) pairs, resolving locators once"""
+    return [(step.get('action', ''), STEP_COMPILERS.get(step.get('action', ''), _unknown)(step))
+            for step in steps]
+
+
+def load_test(test_file):
+    """Read a generated test artifact"""
+    with open(test_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+class ResultChannel:
+    """
+    JSON-lines side file the runtime reports to: one "step" event per
+    executed step, "admission" events while the browser waits to launch,
+    and a final "result" event. Each line is flushed as it is
+    written, so a crash still leaves the steps that ran.
+    """
+
+    def __init__(self, path=None):
+        self._file = open(path, 'a', encoding='utf-8') if path else None
+
+    def emit(self, event):
+        if self._file is not None:
+            self._file.write(json.dumps(event, default=str) + "\n")
+            self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def run_test_file(test_file, channel=None):
+    """Run a generated test artifact and return (status, error, screenshot_path, step_timings)"""
+    return run_test(load_test(test_file), channel)
+
+def run_test(test, channel=None):
+    """
+    Run one test's steps on a borrowed browser session.
+    Returns (status, error, screenshot_path, step_timings); a screenshot is
+    taken on failure and step_timings lists each executed step's duration.
+    Step and result events also go to channel, if given.
+    """
+    channel = channel or ResultChannel()
+    test_name = test['test_name']
+    test_status, error_message, error_type, screenshot_path = "PASS", "", "", ""
+    step_spans = []
+
+    with span("test.run", test_name=test_name):
+        # Borrow a warm browser session; it is reset and returned to the pool afterwards
+        with borrow_driver() as driver:
+            try:
+                compiled = compile_steps(test.get('steps', []))
+                for i, (action, run_step) in enumerate(compiled, 1):
+                    print(f"Step {i}: {action}")
+                    try:
+                        with span("step", index=i, action=action) as step_span:
+                            step_spans.append(step_span)
+                            run_step(driver)
+                    except Exception as e:
+                        channel.emit(_step_event(i, step_span, e))
+                        raise
+                    channel.emit(_step_event(i, step_span))
+
+                print("Test passed successfully.")
+
+            except Exception as e:
+                test_status = "FAIL"
+                error_message = str(e)
+                error_type = type(e).__name__
+                print(f"Test failed with error: {error_message}")
+                with span("screenshot"):
+                    screenshot_path = _save_screenshot(driver)
+
+    step_timings = [{"action": step_span.attrs['action'], "ms": round(step_span.duration_ms, 1)}
+                    for step_span in step_spans]
+    channel.emit({"event": "result", "test_name": test_name, "status": test_status, "error": error_message,
+                  "error_type": error_type, "screenshot": screenshot_path, "step_timings": step_timings})
+    return test_status, error_message, screenshot_path, step_timings
+
+class _PackedTest:
+    """One test of a pack: its tab, the steps it has left and its outcome"""
+
+    def __init__(self, test, timeout=None):
+        self.test_name = test['test_name']
+        self.timeout = timeout
+        self.status, self.error, self.screenshot = "PASS", "", ""
+        self.step_spans = []
+        self.handle = self.context = None
+        # Set once the pack's browser is up, so waiting for it isn't counted against the timeout
+        self.started = None
+        try:
+            self.steps = iter(list(enumerate(compile_steps(test.get('steps', [])), 1)))
+        except Exception as e:
+            self.steps = iter(())
+            self.fail(e)
+
+    def fail(self, error, status="FAIL"):
+        self.status, self.error = status, str(error)
+        print(f"[{self.test_name}] Test failed with error: {self.error}")
+
+    def result(self):
+        step_timings = [{"action": step_span.attrs['action'], "ms": round(step_span.duration_ms, 1)}
+                        for step_span in self.step_spans]
+        return self.status, self.error, self.screenshot, step_timings
+
+def run_pack(tests, timeouts=None):
+    """
+    Run several light tests on one borrowed browser session, each in its own
+    tab (and, on Chrome, its own browser context, so cookies and storage are
+    not shared). Steps are interleaved round-robin. A failing step only ends
+    its own test, which gets its own screenshot; a test still running after
+    its timeout (timeouts, in seconds, one per test) is stopped with TIMEOUT.
+    Returns one (status, error, screenshot_path, step_timings) per test, in
+    input order.
+    """
+    packed = [_PackedTest(test, timeout) for test, timeout in zip(tests, timeouts or [None] * len(tests))]
+    with span("pack.run", tests=len(packed)):
+        with borrow_driver() as driver:
+            home = driver.current_window_handle
+            try:
+                for test in packed:
+                    test.handle, test.context = _open_tab(driver)
+                active = [test for test in packed if test.status == "PASS"]
+                started = time.monotonic()
+                for test in packed:
+                    test.started = started
+                while active:
+                    active = [test for test in active if _advance(driver, test)]
+            finally:
+                for test in packed:
+                    _close_tab(driver, test)
+                driver.switch_to.window(home)
+    return [test.result() for test in packed]
+
+def _advance(driver, test):
+    """Run a packed test's next step in its tab; returns whether it has steps left"""
+    if test.timeout is not None and time.monotonic() - test.started > test.timeout:
+        test.fail(f"Test execution timed out after {test.timeout} seconds", status="TIMEOUT")
+        return False
+    try:
+        i, (action, run_step) = next(test.steps)
+    except StopIteration:
+        print(f"[{test.test_name}] Test passed successfully.")
+        return False
+
+    print(f"[{test.test_name}] Step {i}: {action}")
+    try:
+        driver.switch_to.window(test.handle)
+        with span("step", index=i, action=action, test_name=test.test_name) as step_span:
+            test.step_spans.append(step_span)
+            run_step(driver)
+    except Exception as e:
+        test.fail(e)
+        with span("screenshot"):
+            test.screenshot = _save_screenshot(driver)
+        return False
+    return True
+
+def _open_tab(driver):
+    """Open a tab for a packed test; returns (window handle, browser context id or None)"""
+    if hasattr(driver, "execute_cdp_cmd"):
+        try:
+            context = driver.execute_cdp_cmd("Target.createBrowserContext", {})["browserContextId"]
+            handle = driver.execute_cdp_cmd(
+                "Target.createTarget", {"url": "about:blank", "browserContextId": context})["targetId"]
+            if handle in driver.window_handles:
+                return handle, context
+            driver.execute_cdp_cmd("Target.disposeBrowserContext", {"browserContextId": context})
+        except Exception as e:
+            logger.debug(f"Could not open a tab in a new browser context: {e}")
+    # Other browsers get a plain tab, which shares cookies with the rest of the pack
+    driver.switch_to.new_window('tab')
+    return driver.current_window_handle, None
+
+def _close_tab(driver, test):
+    if test.handle is None:
+        return
+    try:
+        if test.context is not None:
+            driver.execute_cdp_cmd("Target.closeTarget", {"targetId": test.handle})
+            driver.execute_cdp_cmd("Target.disposeBrowserContext", {"browserContextId": test.context})
+        else:
+            driver.switch_to.window(test.handle)
+            driver.close()
+    except Exception as e:
+        logger.debug(f"Error closing the tab of {test.test_name}: {e}")
+
+def _step_event(index, step_span, error=None):
+    event = {"event": "step", "index": index, "action": step_span.attrs['action'],
+             "status": "FAIL" if error else "PASS", "ms": round(step_span.duration_ms, 1)}
+    if error is not None:
+        event.update(error=str(error), error_type=type(error).__name__)
+    return event
+
+def _save_screenshot(driver):
+    # Only the grab happens here; encoding and writing run in the background
+    screenshot_path = screenshot_manager.capture(driver)
+    if screenshot_path:
+        print(f"Screenshot saved to: {screenshot_path}")
+    return screenshot_path
+
+
+if __name__ == "__main__":
+    import admission_control
+    from driver_pool import get_pool
+    # This process runs one test and exits: don't reset its browser for reuse
+    get_pool().single_use = True
+    channel = ResultChannel(os.environ.get(RESULT_FILE_ENV))
+    # The executor pauses the test's timeout while its browser waits for admission
+    admission_control.add_listener(channel.emit)
+    try:
+        status, error, screenshot, step_timings = run_test_file(sys.argv[1], channel)
+    except Exception as e:
+        # e.g. the browser failed to start: still report a structured result
+        status, error = "ERROR", f"{type(e).__name__}: {e}"
+        channel.emit({"event": "result", "status": status, "error": str(e), "error_type": type(e).__name__,
+                      "screenshot": "", "step_timings": []})
+    finally:
+        channel.close()
+    print(f"Test Status: {status}")
+    if error:
+        print(f"Error: {error}")
+    sys.exit(0 if status == "PASS" else 1)
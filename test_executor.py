@@ -1,69 +1,516 @@
 import subprocess
 import os
 import sys
-from config import TEST_CASES_DIR, LOGS_DIR
+import signal
+import time
+import queue
+import atexit
+import threading
+import traceback
+import multiprocessing
+from concurrent.futures import Future
+from contextlib import contextmanager
+from config import LOGS_DIR, EXECUTION_MODE, TEST_TIMEOUT, PACK_SIZE, PACK_BROWSERS, PACK_LINGER, PACK_MAX_STEPS
+from config import (STEP_TIMEOUTS, TEST_TIMEOUT_FLOOR, TEST_TIMEOUT_STARTUP, TEST_TIMEOUT_NAVIGATE,
+                    TEST_TIMEOUT_HISTORY_FACTOR, TEST_TIMEOUT_MIN_SAMPLES)
+from metrics import percentile
+from test_generator import normalize_test_name
+from test_index import get_index
 from datetime import datetime
 import logging
-import re  # Add this import
+import json
+from tracing import traced
+from step_runtime import RESULT_FILE_ENV, load_test
 
 logger = logging.getLogger('TestExecutor')
 
-def execute_test(test_code, test_name):
+# Generated tests are step data run by this shared script
+STEP_RUNTIME = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'step_runtime.py')
+
+# How much of a crashed runtime's log goes into the report
+LOG_TAIL_BYTES = 4096
+# How often a running test's result channel is checked for admission events
+EVENT_POLL_INTERVAL = 0.05
+
+def adaptive_timeout(steps, durations_ms=()):
     """
-    Execute the generated test code and return results
+    Seconds a test may run before it is killed. With enough recorded runs
+    (durations_ms, one per completed attempt) it is their p99 times
+    TEST_TIMEOUT_HISTORY_FACTOR; otherwise the longest the steps can
+    legitimately take: browser startup, page loads and each step's own
+    wait timeout. Clamped to [TEST_TIMEOUT_FLOOR, TEST_TIMEOUT].
     """
-    # The test code is already saved by test_generator.py
-    # Find the latest test file for this test name
-    test_files = [f for f in os.listdir(TEST_CASES_DIR) 
-                 if f.startswith(f"test_{test_name.lower().replace(' ', '_')}")]
-    
-    if not test_files:
-        logger.error(f"No test file found for {test_name}")
-        return "ERROR", "Test file not found", "", ""
-    
-    # Get the most recent file
-    test_files.sort(reverse=True)
-    test_file = os.path.join(TEST_CASES_DIR, test_files[0])
+    if len(durations_ms) >= TEST_TIMEOUT_MIN_SAMPLES:
+        timeout = percentile(durations_ms, 99) / 1000 * TEST_TIMEOUT_HISTORY_FACTOR
+    else:
+        timeout = TEST_TIMEOUT_STARTUP + sum(
+            TEST_TIMEOUT_NAVIGATE if step.get('action') == 'navigate'
+            else step.get('timeout', STEP_TIMEOUTS.get(step.get('action'), STEP_TIMEOUTS['default']))
+            for step in steps)
+    return round(min(max(timeout, TEST_TIMEOUT_FLOOR), TEST_TIMEOUT), 1)
+
+@traced("execute")
+def execute_test(test_code, test_name, test_file=None, mode=None, timeout=None):
+    """
+    Execute the generated test code and return results.
+    Pass test_file to run a specific generated file; concurrent runs of the
+    same test name must do so, otherwise the latest file is picked.
+    mode is "subprocess" (a fresh step runtime per test), "inprocess"
+    (a long-lived worker process) or "packed" (light tests share a
+    worker's browser, one tab each); it defaults to EXECUTION_MODE.
+    A test still running after timeout seconds (default TEST_TIMEOUT; see
+    adaptive_timeout) is killed together with its driver and browser.
+    Returns (status, output, test_file, screenshot_path, step_timings).
+    """
+    timeout = timeout or TEST_TIMEOUT
+    if test_file is None:
+        # The test is already saved by test_generator.py; look up its latest artifact
+        test_file = get_index().latest_for_name(normalize_test_name(test_name))
+        
+        if not test_file:
+            logger.error(f"No test file found for {test_name}")
+            return "ERROR", "Test file not found", "", "", []
     
-    # Set up log file - FIXED: Add proper timestamp variable
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    # Set up log file - microseconds keep concurrent runs from sharing a log
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
     log_file = os.path.join(LOGS_DIR, f"test_{test_name}_{timestamp}.log")
+
+    mode = mode or EXECUTION_MODE
+    if mode == "packed" and len(load_test(test_file).get('steps', [])) <= PACK_MAX_STEPS:
+        return _execute_packed(test_file, timeout)
+    if mode in ("inprocess", "packed"):
+        return _execute_in_worker(test_name, test_file, log_file, timeout)
     
+    # The runtime reports step and result events here; its console output streams to the log
+    result_file = f"{os.path.splitext(log_file)[0]}.results.jsonl"
     try:
-        # Run the test using subprocess
-        result = subprocess.run(
-            [sys.executable, test_file],
-            capture_output=True,
-            text=True,
-            cwd=os.path.dirname(os.path.abspath(__file__)),
-            timeout=300  # 5 minute timeout
-        )
-        
-        # Save log output
-        with open(log_file, 'w') as f:
-            f.write("STDOUT:\n")
-            f.write(result.stdout)
-            f.write("\nSTDERR:\n")
-            f.write(result.stderr)
-        
-        # Determine status
-        status = "PASS" if result.returncode == 0 else "FAIL"
-        output = result.stderr if result.stderr else result.stdout
-        
-        # Find screenshot path from output using regex for better reliability
-        screenshot_path = ""
-        screenshot_match = re.search(r"Screenshot saved to:\s*(.+)", output)
-        if screenshot_match:
-            screenshot_path = screenshot_match.group(1).strip()
+        with open(log_file, 'w') as log:
+            process = subprocess.Popen(
+                [sys.executable, STEP_RUNTIME, test_file],
+                stdout=log,
+                stderr=subprocess.STDOUT,
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+                env=dict(os.environ, **{RESULT_FILE_ENV: result_file}),
+                # Its own process group, so a kill also takes chromedriver and the browser with it
+                **_NEW_PROCESS_GROUP
+            )
+            if not _wait_for_runtime(process, result_file, timeout):
+                kill_process_group(process.pid)
+                process.wait()
+                error_msg = f"Test execution timed out after {timeout} seconds"
+                logger.error(error_msg)
+                return "TIMEOUT", error_msg, test_file, "", _read_step_timings(result_file)
+
+        result = _read_result(result_file)
+        if result is None:
+            status = "ERROR"
+            output = (f"Test runtime exited with code {process.returncode} without reporting a result:\n"
+                      f"{_log_tail(log_file)}")
+            screenshot_path, step_timings = "", _read_step_timings(result_file)
+        else:
+            status = result["status"]
+            output = result["error"]
+            screenshot_path, step_timings = result["screenshot"], result["step_timings"]
         
         logger.info(f"Test execution completed with status: {status}")
-        return status, output, test_file, screenshot_path
+        return status, output, test_file, screenshot_path, step_timings
         
-    except subprocess.TimeoutExpired:
-        error_msg = "Test execution timed out after 5 minutes"
-        logger.error(error_msg)
-        return "TIMEOUT", error_msg, test_file, ""
     except Exception as e:
         error_msg = f"Error executing test: {str(e)}"
         logger.error(error_msg)
-        return "ERROR", error_msg, test_file, ""
\ No newline at end of file
+        return "ERROR", error_msg, test_file, "", []
+
+
+class _Deadline:
+    """
+    A test's timeout, paused while its browser launch waits for admission
+    (see admission_control): waiting for host headroom isn't the test being
+    slow.
+    """
+
+    def __init__(self, timeout):
+        self.end = time.time() + timeout
+        self._waiting_since = None
+
+    def admission(self, event):
+        """Apply an admission event the test reported"""
+        if event["waiting"]:
+            self._waiting_since = event["time"]
+        elif self._waiting_since is not None:
+            self.end += event["time"] - self._waiting_since
+            self._waiting_since = None
+
+    def remaining(self):
+        """Seconds left; while waiting for admission, those left when the wait began"""
+        return self.end - (self._waiting_since or time.time())
+
+def _wait_for_runtime(process, result_file, timeout):
+    """
+    Wait for a step runtime process to report its result; False if it ran
+    out of time. Once the result is in, the process is left to finish in
+    the background: what it still does (encoding a failure screenshot,
+    quitting the browser) is not the test's time.
+    """
+    deadline = _Deadline(timeout)
+    position = 0
+    while True:
+        position, reported = _read_new_events(result_file, position, deadline)
+        if reported:
+            threading.Thread(target=_reap, args=(process, TEST_TIMEOUT), daemon=True).start()
+            return True
+        remaining = deadline.remaining()
+        if remaining <= 0:
+            return False
+        try:
+            process.wait(timeout=min(remaining, EVENT_POLL_INTERVAL))
+            return True
+        except subprocess.TimeoutExpired:
+            continue
+
+def _read_new_events(result_file, position, deadline):
+    """
+    Read events written to result_file since position, feeding admission
+    events to deadline. Returns (new position, whether the result is in).
+    """
+    reported = False
+    try:
+        with open(result_file, 'r', encoding='utf-8') as f:
+            f.seek(position)
+            for line in iter(f.readline, ''):
+                if not line.endswith("\n"):
+                    # Still being written; read it whole next time
+                    break
+                position = f.tell()
+                event = json.loads(line)
+                if event.get("event") == "admission":
+                    deadline.admission(event)
+                elif event.get("event") == "result":
+                    reported = True
+    except (FileNotFoundError, json.JSONDecodeError):
+        pass
+    return position, reported
+
+def _reap(process, timeout):
+    """Wait for a runtime that has reported its result to exit, killing it if it hangs"""
+    try:
+        process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        kill_process_group(process.pid)
+        process.wait()
+
+
+if os.name == "nt":
+    _NEW_PROCESS_GROUP = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+else:
+    _NEW_PROCESS_GROUP = {"start_new_session": True}
+
+def kill_process_group(pid):
+    """Kill a test process started in its own group, and every process it started"""
+    if os.name == "nt":
+        subprocess.run(["taskkill", "/F", "/T", "/PID", str(pid)], capture_output=True)
+        return
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+def _read_events(result_file):
+    """Events the step runtime wrote to its result channel; a torn last line is skipped"""
+    if not os.path.exists(result_file):
+        return
+    with open(result_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+def _read_result(result_file):
+    results = [event for event in _read_events(result_file) if event.get("event") == "result"]
+    return results[-1] if results else None
+
+def _read_step_timings(result_file):
+    """Timings of the steps that finished, for runs that never reported a result"""
+    return [{"action": event["action"], "ms": event["ms"]}
+            for event in _read_events(result_file) if event.get("event") == "step"]
+
+def _log_tail(log_file, size=LOG_TAIL_BYTES):
+    with open(log_file, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        f.seek(max(0, f.tell() - size))
+        return f.read().decode('utf-8', errors='replace')
+
+
+def _execute_in_worker(test_name, test_file, log_file, timeout=TEST_TIMEOUT):
+    """
+    Run a generated test inside a long-lived worker process.
+    The worker keeps selenium imported and its driver pool warm between tests.
+    """
+    worker = _acquire_worker()
+    try:
+        status, output, screenshot_path, step_timings = worker.run(test_file, log_file, timeout)
+    except TimeoutError:
+        worker.kill()
+        error_msg = f"Test execution timed out after {timeout} seconds"
+        logger.error(error_msg)
+        return "TIMEOUT", error_msg, test_file, "", []
+    except (EOFError, OSError):
+        worker.kill()
+        error_msg = f"Test worker crashed (exit code {worker.exitcode})"
+        logger.error(error_msg)
+        return "ERROR", error_msg, test_file, "", []
+
+    _release_worker(worker)
+    logger.info(f"Test execution completed with status: {status}")
+    return status, output, test_file, screenshot_path, step_timings
+
+
+def _execute_packed(test_file, timeout=TEST_TIMEOUT):
+    """Run a light test as part of a pack; blocks until its pack has finished"""
+    status, output, screenshot_path, step_timings = get_packer().submit(test_file, timeout).result()
+    logger.info(f"Test execution completed with status: {status}")
+    return status, output, test_file, screenshot_path, step_timings
+
+
+class TestPacker:
+    """
+    Groups light tests submitted from many threads into packs of up to
+    `size` and runs each pack in one worker's browser, one tab per test, at
+    most `browsers` packs at a time. A pack is dispatched once it is full or
+    `linger` seconds after its first test arrived.
+    """
+
+    def __init__(self, size=PACK_SIZE, browsers=PACK_BROWSERS, linger=PACK_LINGER):
+        self.size = max(1, size)
+        self.browsers = max(1, browsers)
+        self.linger = linger
+        self._queue = queue.Queue()
+        self._free_browsers = threading.Semaphore(self.browsers)
+        threading.Thread(target=self._dispatch, name="test-packer", daemon=True).start()
+
+    def submit(self, test_file, timeout=TEST_TIMEOUT):
+        """Queue a test artifact; the future resolves to (status, output, screenshot_path, step_timings)"""
+        future = Future()
+        self._queue.put(((test_file, timeout), future))
+        return future
+
+    def _dispatch(self):
+        while True:
+            # Keep collecting while every browser is busy, so packs fill up
+            self._free_browsers.acquire()
+            pack = [self._queue.get()]
+            deadline = time.monotonic() + self.linger
+            while len(pack) < self.size:
+                try:
+                    pack.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            threading.Thread(target=self._run, args=(pack,), daemon=True).start()
+
+    def _run(self, pack):
+        try:
+            results = _run_pack_in_worker([test for test, _ in pack])
+        except Exception as e:
+            results = [("ERROR", f"Error executing test pack: {e}", "", [])] * len(pack)
+        finally:
+            self._free_browsers.release()
+        for (_, future), result in zip(pack, results):
+            future.set_result(tuple(result))
+
+def _run_pack_in_worker(tests):
+    """Run (test artifact, timeout) pairs as one pack inside a long-lived worker process"""
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+    log_file = os.path.join(LOGS_DIR, f"pack_{len(tests)}_{timestamp}.log")
+    # Packed tests interleave, so the pack may take as long as running them one by one
+    timeout = sum(test_timeout for _, test_timeout in tests)
+    logger.info(f"Running a pack of {len(tests)} tests (log: {log_file})")
+
+    worker = _acquire_worker()
+    try:
+        results = worker.run(tests, log_file, timeout)
+    except TimeoutError:
+        worker.kill()
+        error_msg = f"Test pack timed out after {timeout} seconds"
+        logger.error(error_msg)
+        return [("TIMEOUT", error_msg, "", [])] * len(tests)
+    except (EOFError, OSError):
+        worker.kill()
+        error_msg = f"Test worker crashed (exit code {worker.exitcode})"
+        logger.error(error_msg)
+        return [("ERROR", error_msg, "", [])] * len(tests)
+
+    _release_worker(worker)
+    return results
+
+_packer = None
+_packer_lock = threading.Lock()
+
+def start_packer(size=PACK_SIZE, browsers=PACK_BROWSERS):
+    """Create the process-wide test packer with the given pack size and browser count"""
+    global _packer
+    with _packer_lock:
+        if _packer is None:
+            _packer = TestPacker(size, browsers)
+        return _packer
+
+def get_packer():
+    """Return the process-wide test packer, creating it with the configured sizes on first use"""
+    return start_packer()
+
+
+class TestWorker:
+    """A spawned interpreter that runs generated tests sent over a pipe"""
+
+    def __init__(self):
+        # spawn works the same on Windows and Linux and is safe with threads
+        context = multiprocessing.get_context("spawn")
+        self._conn, child_conn = context.Pipe()
+        self._process = context.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self._process.start()
+        child_conn.close()
+
+    @property
+    def exitcode(self):
+        return self._process.exitcode
+
+    def is_alive(self):
+        return self._process.is_alive()
+
+    def run(self, test_file, log_file, timeout):
+        """
+        Run one test and return (status, output, screenshot_path, step_timings).
+        Given a list of (test file, timeout) pairs, run them as a pack and
+        return a list of those.
+        """
+        self._conn.send((test_file, log_file))
+        deadline = _Deadline(timeout)
+        while True:
+            if not self._conn.poll(max(0.0, deadline.remaining())):
+                if deadline.remaining() <= 0:
+                    raise TimeoutError(test_file)
+                continue
+            message = self._conn.recv()
+            if isinstance(message, dict) and message.get("event") == "admission":
+                deadline.admission(message)
+                continue
+            return message
+
+    def stop(self):
+        """Ask the worker to exit after its current test"""
+        try:
+            self._conn.send(None)
+        except OSError:
+            pass
+        self._process.join(timeout=10)
+        if self._process.is_alive():
+            self.kill()
+
+    def kill(self):
+        """Kill the worker with the drivers and browsers it started"""
+        kill_process_group(self._process.pid)
+        self._process.kill()
+        self._process.join()
+        self._conn.close()
+
+
+_idle_workers = []
+_workers_lock = threading.Lock()
+
+def _acquire_worker():
+    with _workers_lock:
+        if _idle_workers:
+            return _idle_workers.pop()
+    return TestWorker()
+
+def _release_worker(worker):
+    if not worker.is_alive():
+        return
+    with _workers_lock:
+        _idle_workers.append(worker)
+
+@atexit.register
+def shutdown_workers():
+    """Stop every idle in-process worker"""
+    with _workers_lock:
+        workers = list(_idle_workers)
+        _idle_workers.clear()
+    for worker in workers:
+        worker.stop()
+
+
+def _worker_main(conn):
+    """Entry point of a TestWorker process: serve test runs until told to stop"""
+    if os.name != "nt":
+        # Lead a process group of our own so kill() also reaches chromedriver and the browser
+        os.setsid()
+    # Pay for the heavy imports once per worker instead of once per test
+    import selenium.webdriver  # noqa: F401
+    import step_runtime
+    import admission_control
+
+    # Admission waits pause the parent's timeout for the test
+    send_lock = threading.Lock()
+    def send(message):
+        with send_lock:
+            conn.send(message)
+    admission_control.add_listener(send)
+
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            break
+        if request is None:
+            break
+        test_file, log_file = request
+        if isinstance(test_file, list):
+            send(_run_pack_artifacts(step_runtime, test_file, log_file))
+        else:
+            send(_run_test_artifact(step_runtime, test_file, log_file))
+
+    # multiprocessing skips atexit handlers in children, so quit the browsers and
+    # write out queued screenshots here
+    from driver_pool import get_pool
+    import screenshot_manager
+    get_pool().close()
+    screenshot_manager.flush()
+
+@contextmanager
+def _output_to(log_file):
+    """Send the worker's stdout/stderr (including browser driver output) to log_file"""
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved_fds = os.dup(1), os.dup(2)
+    with open(log_file, 'w') as log:
+        os.dup2(log.fileno(), 1)
+        os.dup2(log.fileno(), 2)
+        try:
+            yield
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os.dup2(saved_fds[0], 1)
+            os.dup2(saved_fds[1], 2)
+            os.close(saved_fds[0])
+            os.close(saved_fds[1])
+
+def _run_test_artifact(step_runtime, test_file, log_file):
+    """Run a generated test through the step runtime, logging to log_file"""
+    with _output_to(log_file):
+        try:
+            return step_runtime.run_test_file(test_file)
+        except Exception:
+            output = traceback.format_exc()
+            print(output)
+            return "ERROR", output, "", []
+
+def _run_pack_artifacts(step_runtime, tests, log_file):
+    """Run (test artifact, timeout) pairs as one pack through the step runtime, logging to log_file"""
+    with _output_to(log_file):
+        try:
+            return step_runtime.run_pack([step_runtime.load_test(test_file) for test_file, _ in tests],
+                                         timeouts=[timeout for _, timeout in tests])
+        except Exception:
+            output = traceback.format_exc()
+            print(output)
+            return [("ERROR", output, "", [])] * len(tests)
@@ -0,0 +1,251 @@
+"""
+Per-test run history, flakiness scores and the retry policy.
+
+Every recorded run stores its final status, how many attempts it took and
+its duration. A test's flakiness is the flip rate of its recent attempts:
+how often consecutive attempts disagree (pass after fail or fail after
+pass). A test that always passes or always fails scores 0; one that
+alternates scores close to 1. The history also gives the expected duration
+batch scheduling and distributed sharding use.
+"""
+
+import math
+import os
+import random
+import sqlite3
+import threading
+import time
+import logging
+from config import (HISTORY_FILE, HISTORY_WINDOW, HISTORY_MIN_RUNS, RETRY_MAX_RETRIES, RETRY_BUDGET_RATIO,
+                    RETRY_BACKOFF_BASE, RETRY_BACKOFF_MAX, RETRY_ON)
+from metrics import percentile
+from run_manifest import instruction_hash
+
+logger = logging.getLogger('TestHistory')
+
+
+def attempt_statuses(status, attempts):
+    """Statuses of a run's attempts: every attempt before the last one failed"""
+    attempts = max(1, attempts or 1)
+    return ["FAIL"] * (attempts - 1) + [status]
+
+def flip_rate(statuses):
+    """Fraction of consecutive attempts whose pass/fail outcome differs"""
+    passed = [status == "PASS" for status in statuses]
+    if len(passed) < 2:
+        return 0.0
+    return sum(a != b for a, b in zip(passed, passed[1:])) / (len(passed) - 1)
+
+def is_flaky_pass(entry):
+    """A run that passed only after a retry"""
+    return entry.get("status") == "PASS" and (entry.get("attempts") or 1) > 1
+
+
+class TestHistory:
+    """
+    SQLite table of the last `window` runs of each instruction: status,
+    attempts and pipeline duration.
+    """
+
+    def __init__(self, path=HISTORY_FILE, window=HISTORY_WINDOW):
+        self.path = path
+        self.window = window
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS history ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " instruction_hash TEXT NOT NULL,"
+                " run_id TEXT,"
+                " status TEXT NOT NULL,"
+                " attempts INTEGER NOT NULL,"
+                " duration_ms REAL,"
+                " execute_ms REAL,"
+                " recorded REAL NOT NULL)"
+            )
+            try:
+                # Histories written before execute_ms was tracked
+                self._conn.execute("ALTER TABLE history ADD COLUMN execute_ms REAL")
+            except sqlite3.OperationalError:
+                pass
+            self._conn.execute("CREATE INDEX IF NOT EXISTS history_test ON history (instruction_hash, id)")
+            self._conn.commit()
+        return self._conn
+
+    def record(self, entry):
+        """Store the outcome of running entry["instruction"]; reused results are not new runs"""
+        instruction = entry.get("instruction")
+        if not instruction or entry.get("reused_from"):
+            return
+        durations = [entry.get(field) for field in ("parse_ms", "generate_ms", "execute_ms")]
+        duration_ms = sum(d or 0 for d in durations) if entry.get("execute_ms") is not None else None
+        key = instruction_hash(instruction)
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT INTO history (instruction_hash, run_id, status, attempts, duration_ms, execute_ms, recorded)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, entry.get("run_id"), entry["status"], entry.get("attempts") or 1, duration_ms,
+                 entry.get("execute_ms"), time.time())
+            )
+            # Only the newest `window` runs count; drop the rest as we go
+            conn.execute(
+                "DELETE FROM history WHERE instruction_hash = ? AND id NOT IN"
+                " (SELECT id FROM history WHERE instruction_hash = ? ORDER BY id DESC LIMIT ?)",
+                (key, key, self.window)
+            )
+            conn.commit()
+
+    def stats(self, instructions):
+        """
+        Map each instruction with history to {"runs", "flakiness",
+        "pass_rate", "duration_ms"}, duration_ms being the median of its
+        recorded runs (None if none completed).
+        """
+        by_hash = {instruction_hash(instruction): instruction for instruction in instructions}
+        hashes = sorted(by_hash)
+        runs = {}
+        with self._lock:
+            conn = self._connect()
+            # Chunked to stay under SQLite's bound-parameter limit
+            for start in range(0, len(hashes), 500):
+                chunk = hashes[start:start + 500]
+                for key, status, attempts, duration_ms in conn.execute(
+                        "SELECT instruction_hash, status, attempts, duration_ms FROM history"
+                        f" WHERE instruction_hash IN ({','.join('?' * len(chunk))}) ORDER BY id", chunk):
+                    runs.setdefault(key, []).append((status, attempts, duration_ms))
+
+        stats = {}
+        for key, rows in runs.items():
+            statuses = [s for status, attempts, _ in rows for s in attempt_statuses(status, attempts)]
+            durations = [duration_ms for _, _, duration_ms in rows if duration_ms is not None]
+            stats[by_hash[key]] = {
+                "runs": len(rows),
+                "flakiness": flip_rate(statuses),
+                "pass_rate": sum(status == "PASS" for status, _, _ in rows) / len(rows),
+                "duration_ms": percentile(durations, 50) if durations else None,
+            }
+        return stats
+
+    def durations(self, instructions):
+        """Median recorded pipeline duration (ms) per instruction that has one"""
+        return {instruction: s["duration_ms"] for instruction, s in self.stats(instructions).items()
+                if s["duration_ms"] is not None}
+
+    def attempt_durations(self, instruction):
+        """
+        Recorded execution times (ms) of single attempts that ran to
+        completion; timed-out runs are left out so a hang can't raise the
+        next timeout.
+        """
+        with self._lock:
+            conn = self._connect()
+            return [row[0] for row in conn.execute(
+                "SELECT execute_ms FROM history WHERE instruction_hash = ? AND attempts = 1"
+                " AND status != 'TIMEOUT' AND execute_ms IS NOT NULL", (instruction_hash(instruction),))]
+
+    def schedule(self, instructions, max_retries=RETRY_MAX_RETRIES):
+        """
+        Instructions in the order to start them: longest expected cost first,
+        counting the retries a flaky test is likely to need, so slow and
+        flaky tests don't end up as the tail of a parallel batch. Tests
+        without history are assumed to take the median known duration.
+        """
+        stats = self.stats(instructions)
+        known = [s["duration_ms"] for s in stats.values() if s["duration_ms"] is not None]
+        default = percentile(known, 50) if known else 0.0
+
+        def expected_cost(instruction):
+            s = stats.get(instruction)
+            if s is None:
+                return default
+            duration = s["duration_ms"] if s["duration_ms"] is not None else default
+            return duration * (1 + s["flakiness"] * max_retries)
+        return sorted(instructions, key=expected_cost, reverse=True)
+
+
+class RetryPolicy:
+    """
+    Decides whether a failed attempt is run again. Each test gets up to
+    max_retries retries, with exponential backoff and jitter between them,
+    and all tests share a budget of retries so a broken site can't multiply
+    a batch's runtime. Tests whose history shows they fail every time get
+    no retries: their failures are not transient. Thread-safe; create one
+    per batch.
+    """
+
+    def __init__(self, max_retries=RETRY_MAX_RETRIES, budget=None, stats=None, backoff_base=RETRY_BACKOFF_BASE,
+                 backoff_max=RETRY_BACKOFF_MAX, retry_on=RETRY_ON):
+        self.max_retries = max_retries
+        self.budget = max_retries if budget is None else budget
+        self.stats = stats or {}
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_on = retry_on
+        self._admitted = 0
+        self._granted = self.budget
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_tests(cls, instructions, max_retries=RETRY_MAX_RETRIES):
+        """A policy for a batch, sharing a budget of RETRY_BUDGET_RATIO of its tests"""
+        if not max_retries:
+            return cls(0)
+        budget = max(max_retries, math.ceil(len(instructions) * RETRY_BUDGET_RATIO))
+        return cls(max_retries, budget=budget, stats=get_history().stats(instructions))
+
+    def admit(self, instruction):
+        """
+        Add a test to a streamed batch, whose size isn't known up front: the
+        shared budget grows to RETRY_BUDGET_RATIO of the tests admitted so far
+        """
+        if not self.max_retries:
+            return
+        stats = get_history().stats([instruction])
+        with self._lock:
+            self.stats.update(stats)
+            self._admitted += 1
+            granted = max(self._granted, math.ceil(self._admitted * RETRY_BUDGET_RATIO))
+            self.budget += granted - self._granted
+            self._granted = granted
+
+    def retries_for(self, instruction):
+        """Retry allowance of one test"""
+        s = self.stats.get(instruction)
+        if s is not None and s["runs"] >= HISTORY_MIN_RUNS and s["pass_rate"] == 0 and s["flakiness"] == 0:
+            return 0
+        return self.max_retries
+
+    def should_retry(self, instruction, attempt, status):
+        """Whether to run attempt + 1 after an attempt that ended with status; takes from the budget"""
+        if status not in self.retry_on or attempt > self.retries_for(instruction):
+            return False
+        with self._lock:
+            if self.budget <= 0:
+                logger.warning("Retry budget exhausted, not retrying")
+                return False
+            self.budget -= 1
+            return True
+
+    def delay(self, attempt):
+        """Seconds to wait before attempt + 1"""
+        delay = self.backoff_base * (2 ** (attempt - 1))
+        return min(delay * random.uniform(1.0, 1.5), self.backoff_max)
+
+
+_history = None
+_history_lock = threading.Lock()
+
+def get_history():
+    """Return the process-wide test history"""
+    global _history
+    with _history_lock:
+        if _history is None:
+            _history = TestHistory()
+        return _history
@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import logging
+from config import TEST_CASES_DIR, TEST_INDEX_GC_GRACE_DAYS
+
+logger = logging.getLogger('TestIndex')
+
+INDEX_FILE = os.path.join(TEST_CASES_DIR, 'index.sqlite3')
+
+def step_hash(test_name, steps):
+    """Content address of a generated test: its name and canonical step list"""
+    payload = json.dumps({"test_name": test_name, "steps": steps}, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class TestIndex:
+    """
+    Maps step-list hashes to generated artifacts and test names to their
+    latest artifact, so identical parses reuse one file and executors find
+    a test's file without scanning TEST_CASES_DIR.
+    """
+
+    def __init__(self, path=INDEX_FILE):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS artifacts ("
+                " hash TEXT PRIMARY KEY,"
+                " path TEXT NOT NULL,"
+                " test_name TEXT NOT NULL,"
+                " created REAL NOT NULL,"
+                " last_used REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS names ("
+                " test_name TEXT PRIMARY KEY,"
+                " hash TEXT NOT NULL)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def lookup(self, digest):
+        """Return the artifact path for a step hash, or None if it was never generated or is gone"""
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT path FROM artifacts WHERE hash = ?", (digest,)).fetchone()
+            if row is None:
+                return None
+            if not os.path.exists(row[0]):
+                conn.execute("DELETE FROM artifacts WHERE hash = ?", (digest,))
+                conn.commit()
+                return None
+            return row[0]
+
+    def record(self, digest, test_name, path):
+        """Register an artifact and make it the latest one for test_name"""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT INTO artifacts (hash, path, test_name, created, last_used) VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT(hash) DO UPDATE SET path = excluded.path, last_used = excluded.last_used",
+                (digest, path, test_name, now, now)
+            )
+            conn.execute("INSERT OR REPLACE INTO names (test_name, hash) VALUES (?, ?)", (test_name, digest))
+            conn.commit()
+
+    def latest_for_name(self, test_name):
+        """Return the most recently generated or reused artifact for a test name"""
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT artifacts.path FROM names JOIN artifacts ON artifacts.hash = names.hash"
+                " WHERE names.test_name = ?", (test_name,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def gc(self, grace_days=TEST_INDEX_GC_GRACE_DAYS):
+        """
+        Delete artifacts that no test name points to and that were not used in
+        the last grace_days, plus stray test files the index doesn't know about.
+        Returns the number of files removed.
+        """
+        cutoff = time.time() - grace_days * 24 * 3600
+        with self._lock:
+            conn = self._connect()
+            stale = conn.execute(
+                "SELECT hash, path FROM artifacts"
+                " WHERE hash NOT IN (SELECT hash FROM names) AND last_used < ?", (cutoff,)
+            ).fetchall()
+            conn.executemany("DELETE FROM artifacts WHERE hash = ?", [(digest,) for digest, _ in stale])
+            conn.commit()
+            known = {os.path.abspath(path) for (path,) in conn.execute("SELECT path FROM artifacts")}
+
+        removed = 0
+        for _, path in stale:
+            removed += _remove(path)
+
+        # Files from before the index existed, or whose index entry was lost
+        directory = os.path.dirname(self.path)
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if (entry.is_file() and entry.name.startswith('test_')
+                        and entry.name.endswith(('.json', '.py'))
+                        and os.path.abspath(entry.path) not in known
+                        and entry.stat().st_mtime < cutoff):
+                    removed += _remove(entry.path)
+
+        logger.info(f"Removed {removed} unreferenced test artifacts")
+        return removed
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+        return 1
+    except FileNotFoundError:
+        return 0
+
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_index():
+    """Return the process-wide test index"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = TestIndex()
+        return _index
@@ -0,0 +1,141 @@
+"""
+Lightweight span tracing for the TestSmith pipeline.
+
+Spans always measure their duration, so callers can read `span.duration_ms`
+for report timings. They are only recorded when tracing is enabled, as one
+JSON line per span in a trace file that child processes (test runtimes and
+in-process workers) append to as well. export_chrome_trace() converts that
+file to the Chrome trace-event format (chrome://tracing, Perfetto).
+"""
+
+import contextvars
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger('Tracing')
+
+# Child processes find the trace file through this variable
+TRACE_FILE_ENV = "TESTSMITH_TRACE_FILE"
+
+_trace_file = os.environ.get(TRACE_FILE_ENV)
+_trace_fd = None
+_write_lock = threading.Lock()
+_current_span = contextvars.ContextVar('current_span', default=None)
+_span_ids = itertools.count(1)
+
+
+class Span:
+    """A timed operation; add attributes with span.set(key=value)"""
+
+    def __init__(self, name, attrs, parent):
+        self.name = name
+        self.attrs = attrs
+        self.id = f"{os.getpid()}-{next(_span_ids)}"
+        self.parent_id = parent.id if parent else None
+        self.start_us = time.time_ns() // 1000
+        self._start = time.perf_counter()
+        self.duration_ms = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def finish(self):
+        self.duration_ms = (time.perf_counter() - self._start) * 1000
+
+
+def enable(trace_file):
+    """Record spans from this process and its children to trace_file (JSONL)"""
+    global _trace_file
+    os.makedirs(os.path.dirname(os.path.abspath(trace_file)), exist_ok=True)
+    _trace_file = os.path.abspath(trace_file)
+    os.environ[TRACE_FILE_ENV] = _trace_file
+    logger.info(f"Tracing to {_trace_file}")
+
+def is_enabled():
+    return _trace_file is not None
+
+@contextmanager
+def span(name, **attrs):
+    """Time the enclosed block as a child of the current span"""
+    current = Span(name, attrs, _current_span.get())
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.set(error=type(e).__name__)
+        raise
+    finally:
+        current.finish()
+        _current_span.reset(token)
+        if _trace_file is not None:
+            _record(current)
+
+def traced(name):
+    """Decorator: run the function inside span(name)"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def annotate(**attrs):
+    """Add attributes to the current span, if there is one"""
+    current = _current_span.get()
+    if current is not None:
+        current.set(**attrs)
+
+def _record(finished):
+    global _trace_fd
+    line = json.dumps({
+        "name": finished.name,
+        "id": finished.id,
+        "parent": finished.parent_id,
+        "ts": finished.start_us,
+        "dur_ms": round(finished.duration_ms, 3),
+        "pid": os.getpid(),
+        "tid": threading.get_ident(),
+        "attrs": finished.attrs,
+    }, default=str) + "\n"
+    with _write_lock:
+        if _trace_fd is None:
+            _trace_fd = os.open(_trace_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        # One O_APPEND write per span keeps lines from different processes intact
+        os.write(_trace_fd, line.encode("utf-8"))
+
+
+def iter_spans(trace_file):
+    """Stream recorded spans from a trace file"""
+    with open(trace_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+def export_chrome_trace(trace_file, output_file):
+    """Convert a JSONL trace into a Chrome trace-event JSON file"""
+    with open(output_file, 'w', encoding='utf-8') as out:
+        out.write('{"traceEvents":[\n')
+        for i, recorded in enumerate(iter_spans(trace_file)):
+            event = {
+                "name": recorded["name"],
+                "cat": recorded["name"].split('.')[0],
+                "ph": "X",
+                "ts": recorded["ts"],
+                "dur": int(recorded["dur_ms"] * 1000),
+                "pid": recorded["pid"],
+                "tid": recorded["tid"],
+                "args": recorded["attrs"],
+            }
+            out.write((",\n" if i else "") + json.dumps(event, default=str))
+        out.write('\n],"displayTimeUnit":"ms"}\n')
+    logger.info(f"Chrome trace written to {output_file}")
+    return output_file